@@ -1,8 +1,5 @@
-import openai # type: ignore
 import json
-from config import OPENAI_API_KEY
-# Set up OpenAI API Key
-openai.api_key = OPENAI_API_KEY  # 🔹 Replace this with your actual OpenAI API key
+from agents.llm_gateway import chat_completion
 
 def call_llm_with_citation_test(query, retrieved_context):
     """Test LLM response with a sample legal question and citations."""
@@ -39,18 +36,20 @@ def call_llm_with_citation_test(query, retrieved_context):
     """
 
     # ✅ Call OpenAI GPT-4 API
-    response = openai.chat.completions.create(
+    response_text = chat_completion(
+        stage="answer",
         model="gpt-4",
         messages=[
             {"role": "system", "content": "You are an Indian legal expert."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.1
+        temperature=0.1,
+        validate=json.loads  # Only well-formed JSON answers are cached
     )
 
     # ✅ Extract Response Properly
     try:
-        response_text = response.choices[0].message.content.strip()
+        response_text = response_text.strip()
         llm_responses = json.loads(response_text)  # ✅ Ensure parsing is correct
     except (json.JSONDecodeError, IndexError) as e:
         print(f"⚠️ JSON Parsing Error in LLM Response: {e}")
@@ -1,13 +1,19 @@
-from agents.retrieval_context import retrieve_legal_text
+from agents.retrieval_context import retrieve_legal_text, start_speculative_retrieval, discard_speculation
 from agents.LLM import call_llm_with_citation_test
 from agents.evaluation_agent import process_evaluation
-from agents.query_processing import classify_legal_domain
+from agents.query_processing import classify_deferring_safety, await_safety_check
+from agents.domain_classifier import classifier_stats, local_classifier_ready
 from agents.relevancy_agent import fact_checking_agent
 from agents.summarize_responses import call_summarizer_agent
 from agents.responsible_flow import responsible_agent
+from config import SPECULATIVE_RETRIEVAL
 import json
 
 
+NO_GROUNDED_CONTEXT_RESPONSE = (
+    "I could not find provisions in the indexed civil and criminal laws that are relevant enough to answer "
+    "this question reliably. Please rephrase it, or mention the act or section you are asking about."
+)
 
 
 # ✅ Query Processing Agent (Determines Law Type)
@@ -17,14 +23,24 @@ def query_processing_agent(state):
     """
     print(f"🔹 Query Processing Agent Classifying Query: {state.query}")
 
-    # ✅ Call Query Classification Logic
-    classified_law_type = classify_legal_domain(state.query)
+    # ✅ Search both collections while the query is being classified; the retrieval agent keeps the matching results.
+    # The local classifier needs the query embedding at once, so it is then computed here rather than in the background.
+    if SPECULATIVE_RETRIEVAL:
+        start_speculative_retrieval(state.query, embed_now=local_classifier_ready())
+
+    # ✅ Call Query Classification Logic (a locally labelled query's safety check runs on during retrieval)
+    classified_law_type, state.safety_check_handle = classify_deferring_safety(state.query)
 
     # ✅ Store Classification in State
      # ✅ Store Classification in State
     state.law_type = classified_law_type if classified_law_type in ["civil_law", "criminal_law", "both"] else "unknown"
 
     print(f"✅ Classified Query as: {state.law_type}")
+    print(f"🔹 Domain classification: {classifier_stats()}")
+
+    # ✅ Nothing will be retrieved for an unclassified query, so its speculative searches are dropped
+    if SPECULATIVE_RETRIEVAL and state.law_type == "unknown":
+        discard_speculation(state.query)
 
     return state
 
@@ -37,8 +53,19 @@ def retrieval_agent(state):
     """
     print(f"🔹 Retrieval Agent Fetching Text for: {state.query} ({state.law_type})")
 
-    # ✅ Call Retrieval Logic
-    retrieved_texts = retrieve_legal_text(state.query, state.law_type)
+    # ✅ Call Retrieval Logic, then wait for a safety check left running by classification
+    try:
+        retrieved_texts = retrieve_legal_text(state.query, state.law_type)
+    finally:
+        # Without a handle the LLM gated the query during classification (its warning is not a law type)
+        safety_check = await_safety_check(state.safety_check_handle) if state.safety_check_handle else "Safe"
+        state.safety_check_handle = None
+
+    # ✅ An unsafe query gets its safety warning instead of an answer
+    if safety_check != "Safe":
+        print(f"⚠️ Safety check rejected the query: {safety_check}")
+        state.safety_warning = safety_check
+        retrieved_texts = []
 
     # # ✅ Debugging Print
     # print(f"DEBUG: Retrieved Texts Before Storing → {retrieved_texts}")
@@ -50,11 +77,38 @@ def retrieval_agent(state):
         print("⚠️ Warning: Retrieved texts are not in a valid format! Resetting to empty.")
         state.retrieved_texts = []
 
+    # ✅ Nothing cleared the similarity floor, so there is nothing to ground an answer in
+    state.no_grounded_context = not state.retrieved_texts
+
     print(f"✅ Stored Retrieved Texts: {len(state.retrieved_texts)} → {state.retrieved_texts}")
     
     return state
 
 
+def route_after_retrieval(state):
+    """
+    Skips generation, evaluation and summarization when retrieval found no grounded context
+    or the safety check rejected the query.
+    """
+    return "no_context_agent" if state.no_grounded_context else "llm_agent"
+
+
+def no_context_agent(state):
+    """
+    Answers without calling the LLMs when no retrieved legal text is relevant enough, or
+    with the safety warning of a rejected query.
+    """
+    if state.safety_warning:
+        state.final_response = state.safety_warning
+        return state
+
+    print(f"🔹 No grounded legal context found for: {state.query}")
+
+    state.final_response = NO_GROUNDED_CONTEXT_RESPONSE
+
+    return state
+
+
 
 
 def llm_agent(state):
@@ -0,0 +1,161 @@
+import os
+import json
+import argparse
+import threading
+import numpy as np
+from config import DOMAIN_CLASSIFIER_ENABLED, DOMAIN_CLASSIFIER_MIN_MARGIN
+
+# Labelled queries the classifier is trained from, and the centroids it is persisted as
+DOMAIN_QUERIES_PATH = "data/domain_queries.json"
+DOMAIN_CLASSIFIER_PATH = "data/domain_classifier/centroids.npz"
+DOMAIN_LABELS = ("civil_law", "criminal_law", "both")
+
+_classifier = None
+_classifier_lock = threading.Lock()
+_counters = {"local_hits": 0, "llm_fallbacks": 0}
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class DomainClassifier:
+    """
+    Nearest-centroid law-domain classifier over bge-m3 query embeddings.
+
+    Each label is the normalized mean of its labelled queries' unit embeddings. A query
+    gets the label of its most similar centroid; the confidence is the cosine margin
+    over the runner-up, so queries sitting between two domains score near zero.
+    """
+
+    def __init__(self, labels, centroids):
+        self.labels = list(labels)
+        self.centroids = normalize(centroids)
+
+    @classmethod
+    def train(cls, embeddings, labels):
+        """Builds the centroids from (n, dim) embeddings and their n labels."""
+        embeddings, labels = normalize(embeddings), np.asarray(labels)
+        present = [label for label in DOMAIN_LABELS if label in set(labels.tolist())]
+        return cls(present, np.stack([embeddings[labels == label].mean(axis=0) for label in present]))
+
+    def save(self, path=DOMAIN_CLASSIFIER_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, labels=np.array(self.labels, dtype=str), centroids=self.centroids)
+
+    @classmethod
+    def load(cls, path=DOMAIN_CLASSIFIER_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["labels"].tolist(), data["centroids"])
+
+    def predict(self, embedding):
+        """
+        Returns:
+            tuple[str, float]: The nearest label and its cosine margin over the runner-up.
+        """
+        similarities = self.centroids @ normalize(embedding)
+        order = np.argsort(-similarities)
+        margin = similarities[order[0]] - similarities[order[1]] if len(order) > 1 else 1.0
+        return self.labels[order[0]], float(margin)
+
+
+def get_domain_classifier():
+    """Returns the persisted classifier, or None if it has not been trained yet."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None and os.path.exists(DOMAIN_CLASSIFIER_PATH):
+            _classifier = DomainClassifier.load()
+        return _classifier
+
+
+def local_classifier_ready():
+    """Returns True when classification starts by embedding the query (the classifier is enabled and trained)."""
+    return DOMAIN_CLASSIFIER_ENABLED and get_domain_classifier() is not None
+
+
+def classify_locally(query, min_margin=DOMAIN_CLASSIFIER_MIN_MARGIN):
+    """
+    Labels a query with the local classifier if it is confident enough.
+
+    The query is embedded through the retrieval query cache, so the retrieval agent
+    reuses the same embedding instead of encoding the query again; if a speculative
+    retrieval is already embedding it, its embedding is awaited instead.
+
+    Returns:
+        str | None: "civil_law", "criminal_law" or "both", or None when the LLM should
+        decide (no trained classifier, or a margin below `min_margin`).
+    """
+    classifier = get_domain_classifier()
+    label = None
+    if classifier is not None:
+        # Imported here: loading the retrieval module opens the vector stores
+        from agents.retrieval_context import query_embedding
+        embedding = query_embedding(query)
+        predicted, margin = classifier.predict(embedding)
+        print(f"🔹 Local domain classifier: {predicted} (margin {margin:.3f})")
+        if margin >= min_margin:
+            label = predicted
+
+    with _classifier_lock:
+        _counters["local_hits" if label else "llm_fallbacks"] += 1
+    return label
+
+
+def classifier_stats():
+    """Returns how many queries the local classifier labelled and how many went to the LLM."""
+    with _classifier_lock:
+        stats = dict(_counters)
+    total = stats["local_hits"] + stats["llm_fallbacks"]
+    stats["local_hit_rate"] = stats["local_hits"] / total if total else 0.0
+    stats["llm_fallback_rate"] = stats["llm_fallbacks"] / total if total else 0.0
+    return stats
+
+
+def train_domain_classifier(queries_path=DOMAIN_QUERIES_PATH, classifier_path=DOMAIN_CLASSIFIER_PATH, min_margin=DOMAIN_CLASSIFIER_MIN_MARGIN):
+    """
+    Trains the classifier from a labelled query file ([{"query", "law_type"}, ...]),
+    saves it, and reports its leave-one-out accuracy, overall and on the queries it
+    would answer without the LLM at `min_margin`.
+    """
+    from agents.retrieval_context import embed_queries
+
+    with open(queries_path, "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    queries = [row["query"] for row in rows]
+    labels = [row["law_type"] for row in rows]
+    unknown = set(labels) - set(DOMAIN_LABELS)
+    if unknown:
+        raise ValueError(f"Unknown labels in {queries_path}: {sorted(unknown)}. Expected {DOMAIN_LABELS}.")
+
+    embeddings = normalize(embed_queries(queries))
+    classifier = DomainClassifier.train(embeddings, labels)
+    classifier.save(classifier_path)
+
+    correct, confident, confident_correct = 0, 0, 0
+    for i in range(len(queries)):
+        held_out = np.arange(len(queries)) != i
+        predicted, margin = DomainClassifier.train(embeddings[held_out], np.asarray(labels)[held_out]).predict(embeddings[i])
+        correct += predicted == labels[i]
+        if margin >= min_margin:
+            confident += 1
+            confident_correct += predicted == labels[i]
+
+    report = {
+        "queries": len(queries),
+        "labels": {label: labels.count(label) for label in classifier.labels},
+        "leave_one_out_accuracy": correct / len(queries),
+        "confident_share": confident / len(queries),
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+    }
+    print(f"✅ Domain classifier saved to: {classifier_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local law-domain classifier from labelled queries.")
+    parser.add_argument("--queries", default=DOMAIN_QUERIES_PATH, help="Labelled query file.")
+    parser.add_argument("--min-margin", type=float, default=DOMAIN_CLASSIFIER_MIN_MARGIN, help="Confidence threshold to report on.")
+    args = parser.parse_args()
+
+    print(json.dumps(train_domain_classifier(args.queries, min_margin=args.min_margin), indent=4))
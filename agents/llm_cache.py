@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from config import LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_DISABLED_STAGES
+
+# Persistent chat completion cache, shared by every stage that calls the LLM gateway
+LLM_CACHE_PATH = "data/llm_cache/responses.sqlite3"
+EVICT_EVERY = 128  # Insertions between size checks
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def request_key(model, messages, **params):
+    """
+    Hashes a chat completion request: model, messages and every sampling parameter
+    (temperature, max_tokens, ...), so requests differing in any of them don't collide.
+    """
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed cache of chat completion responses keyed by `request_key()`.
+
+    Entries older than `ttl_seconds` are treated as misses and purged on the next size
+    check; beyond `max_entries`, the least recently read entries are evicted.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.inserts_since_evict = 0
+        self.hits = {}
+        self.misses = {}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared by the gateway's callers; access is serialized by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, stage TEXT, model TEXT, response TEXT, created_at REAL, accessed_at REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.connection.commit()
+        atexit.register(self.close)
+
+    def get(self, key, stage=None):
+        """Returns the cached response for a request key, or None if absent or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            counters = self.hits if row else self.misses
+            counters[stage] = counters.get(stage, 0) + 1
+            if row is None:
+                return None
+            self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            return row[0]
+
+    def put(self, key, response, stage=None, model=None):
+        """Stores a response, evicting expired and least recently read entries every EVICT_EVERY inserts."""
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, stage, model, response, now, now)
+            )
+            self.inserts_since_evict += 1
+            if self.inserts_since_evict >= EVICT_EVERY:
+                self._evict(now)
+            self.connection.commit()
+
+    def _evict(self, now):
+        self.connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.connection.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+        self.inserts_since_evict = 0
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def stats(self):
+        """Returns the entry count and per-stage hit/miss counters."""
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"entries": entries, "hits": dict(self.hits), "misses": dict(self.misses)}
+
+
+def cache_enabled(stage):
+    """Whether responses of a stage are cached (LLM_CACHE_ENABLED minus LLM_CACHE_DISABLED_STAGES)."""
+    return LLM_CACHE_ENABLED and stage not in LLM_CACHE_DISABLED_STAGES
+
+
+def get_llm_cache():
+    """Returns the process-wide response cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
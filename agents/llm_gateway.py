@@ -0,0 +1,154 @@
+import random
+import asyncio
+import threading
+import httpx
+import openai
+from config import OPENAI_API_KEY, LLM_TIMEOUT_SECONDS, LLM_DEADLINE_SECONDS, LLM_MAX_RETRIES, LLM_MAX_CONCURRENCY
+from agents.llm_cache import cache_enabled, get_llm_cache, request_key
+
+# Errors worth another attempt; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 8.0
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+class LLMGateway:
+    """
+    The one way agents talk to OpenAI: a single AsyncOpenAI client, whose HTTP
+    connection pool is reused by every call, running on a background event loop.
+
+    Synchronous agents call `complete()`, which blocks on the loop; concurrent callers
+    (threads, or async code through `acomplete()`) share the pool instead of paying a
+    TLS handshake per call. Each attempt has a timeout and the whole call (queueing,
+    attempts and backoff) a deadline; failed attempts are retried with jittered
+    exponential backoff, and a semaphore caps in-flight requests (a call waiting to
+    retry doesn't hold a slot).
+
+    Responses are looked up in the persistent LLM response cache before any request is
+    sent, unless the call's stage is opted out of caching. A fresh response is only
+    cached once the caller's `validate` accepts it, so a malformed answer is retried on
+    the next identical request instead of being replayed until it expires.
+    """
+
+    def __init__(self, api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT_SECONDS, deadline=LLM_DEADLINE_SECONDS, max_retries=LLM_MAX_RETRIES, max_concurrency=LLM_MAX_CONCURRENCY):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-gateway", daemon=True)
+        self.thread.start()
+
+        async def setup():
+            # Built on the gateway loop, which owns the connection pool and semaphore
+            http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency))
+            client = openai.AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)  # Retries happen here
+            return client, asyncio.Semaphore(max_concurrency)
+
+        self.client, self.semaphore = asyncio.run_coroutine_threadsafe(setup(), self.loop).result()
+
+    async def _attempt(self, model, messages, timeout, **params):
+        """One request, holding a concurrency slot only while it is in flight."""
+        async with self.semaphore:
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(model=model, messages=messages, timeout=timeout, **params),
+                timeout
+            )
+            return response.choices[0].message.content
+
+    async def _retrying(self, model, messages, timeout, expires, **params):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._attempt(model, messages, min(timeout, expires - loop.time()), **params)
+            except RETRYABLE_ERRORS as e:
+                # Full jitter keeps concurrent retries from hitting the API in lockstep
+                delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+                if attempt == self.max_retries or loop.time() + delay >= expires:
+                    raise
+                print(f"⚠️ LLM call to {model} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _complete(self, model, messages, timeout, deadline, **params):
+        expires = asyncio.get_running_loop().time() + deadline
+        return await asyncio.wait_for(self._retrying(model, messages, timeout, expires, **params), deadline)
+
+    def _cached(self, model, messages, stage, use_cache, params):
+        """Returns (cache key, cached response); the key is None when the call bypasses the cache."""
+        if not (use_cache and cache_enabled(stage)):
+            return None, None
+        key = request_key(model, messages, **params)
+        return key, get_llm_cache().get(key, stage)
+
+    def _store(self, key, response, validate, stage, model):
+        """Caches a fresh response unless the call bypasses the cache or `validate` raises on it."""
+        if key is None or response is None:
+            return
+        if validate is not None:
+            try:
+                validate(response)
+            except Exception as e:
+                print(f"⚠️ Not caching a {stage or model} response that failed validation: {e}")
+                return
+        get_llm_cache().put(key, response, stage, model)
+
+    def complete(self, model, messages, timeout=None, stage=None, use_cache=True, deadline=None, validate=None, **params):
+        """
+        Runs one chat completion and returns the message content.
+
+        Args:
+            model (str): OpenAI model name.
+            messages (list[dict]): Chat messages.
+            timeout (float): Seconds allowed per attempt (defaults to LLM_TIMEOUT_SECONDS).
+            deadline (float): Seconds allowed for the whole call, retries included
+                (defaults to LLM_DEADLINE_SECONDS).
+            validate (callable): Called with a fresh response; if it raises, the response
+                is returned but not cached (e.g. `json.loads` for JSON answers).
+            stage (str): Pipeline stage making the call, for cache opt-outs and statistics.
+            use_cache (bool): False to skip the response cache for this call.
+            **params: Other chat completion parameters (temperature, max_tokens, ...).
+
+        Returns:
+            str: The content of the first choice.
+        """
+        key, response = self._cached(model, messages, stage, use_cache, params)
+        if response is not None:
+            return response
+
+        coroutine = self._complete(model, messages, timeout or self.timeout, deadline or self.deadline, **params)
+        response = asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+        self._store(key, response, validate, stage, model)
+        return response
+
+    async def acomplete(self, model, messages, timeout=None, stage=None, use_cache=True, deadline=None, validate=None, **params):
+        """Awaitable `complete()` for async callers on any event loop."""
+        key, response = self._cached(model, messages, stage, use_cache, params)
+        if response is not None:
+            return response
+
+        coroutine = self._complete(model, messages, timeout or self.timeout, deadline or self.deadline, **params)
+        response = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+        self._store(key, response, validate, stage, model)
+        return response
+
+
+def get_gateway():
+    """Returns the process-wide gateway, starting it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+def chat_completion(model, messages, timeout=None, stage=None, use_cache=True, deadline=None, validate=None, **params):
+    """Runs a chat completion through the shared gateway and returns the message content."""
+    return get_gateway().complete(model, messages, timeout, stage, use_cache, deadline, validate, **params)
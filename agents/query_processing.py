@@ -1,34 +1,102 @@
 import os
-import openai
-from config import OPENAI_API_KEY
+import json
+import time
+import uuid
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from agents.llm_gateway import chat_completion
+from agents.domain_classifier import classify_locally
+from config import CLASSIFICATION_MODE, DOMAIN_CLASSIFIER_ENABLED, LLM_MAX_CONCURRENCY
 
-# Load API Key from .env file
-# load_dotenv()
-# OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai.api_key = OPENAI_API_KEY
+# Verdicts of the safety gate; anything but "Safe" is returned to the user as is
+SAFETY_VERDICTS = (
+    "Safe",
+    "This query involves harm or unethical actions. Please seek professional legal help.",
+    "Not a legal query.",
+    "Not Applicable in Indian Law.",
+)
+LAW_TYPES = ("civil_law", "criminal_law", "both", "na")
+CLASSIFICATION_MODES = ("single", "two_call")
 
-def classify_legal_domain(query: str) -> str:
-    """
-    Uses OpenAI LLM to:
-    1. **Check if the query is safe to process.**
-    2. **Classify the legal domain (Civil Law, Criminal Law, Both, or NA).**
+# Safety checks of locally classified queries, left running while the query is retrieved
+safety_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="safety")
+_pending_safety = {}  # request handle → Future of its check_safety verdict
+_inflight_safety = {}  # (query, use_cache) → running check, joined by concurrent requests for the same query
+_pending_safety_lock = threading.Lock()
 
-    :param query: User's input legal question.
-    :return: Legal domain category OR a safety warning.
-    """
+# Queries timed by `python -m agents.query_processing --benchmark`
+BENCHMARK_QUERIES = [
+    "What is the punishment for murder under the Indian Penal Code?",
+    "How do I file for divorce on grounds of cruelty?",
+    "My business partner forged my signature on a loan agreement. What can I do?",
+    "Can my landlord evict me without notice?",
+    "What is the best recipe for biryani?",
+    "Is bigamy a crime in India and can I get my marriage annulled?",
+]
 
-    # **Step 1: Check for Unsafe or Improper Queries**
-    safety_prompt = f"""
-    You are a legal AI assistant. Your first task is to analyze whether this query is **safe to process** or if it requires ethical intervention.
-
-    ### **🚨 Safety Guidelines:**
+SAFETY_GUIDELINES = """    ### **🚨 Safety Guidelines:**
     - If the query **incites violence, promotes crime, or encourages self-harm**, respond with:  
       `"This query involves harm or unethical actions. Please seek professional legal help."`
     - If the query **is a legal question about crimes and punishments** (e.g., “What happens if I commit theft?”), respond with: `"Safe"`
     - If the query is **non-legal, vague, or lacks legal relevance**, respond with: `"Not a legal query."`
     - If the query **is about foreign laws**, respond with: `"Not Applicable in Indian Law."`
 
-    ### **Query:**  
+"""
+
+CLASSIFICATION_CRITERIA = """    ### **📌 Classification Criteria (Considering ALL Indian Laws)**
+    You must analyze the query based on **legal principles** rather than specific law names:
+
+    ####Civil Law (General Law) Applies When:**
+    The case involves **private disputes** between individuals or entities.  
+    The issue relates to **personal rights & obligations** under Indian **family, property, business, labor, or consumer laws**.  
+    The resolution involves **legal remedies such as compensation, court orders, or compliance** (not punishment).  
+    Examples include:  
+    - **Marriage, Divorce, Maintenance, Child Custody.**  
+    - **Property Disputes, Inheritance, Land Ownership.**  
+    - **Business Contracts, Financial Agreements, Consumer Rights, Employment Laws.**  
+
+    ####Criminal Law Applies When:
+    The case involves **an act punishable under Indian Penal Code (IPC) or other Indian criminal laws**.  
+    The offense is legally **punishable by imprisonment, fines, or state prosecution**.  
+    The case includes elements like **fraud, violence, financial crimes, abuse, public safety violations, or cyber offenses**.  
+    Examples include:  
+    - **Murder, Theft, Fraud, Cybercrimes, Financial Crimes.**  
+    - **Sexual Harassment, Domestic Violence, Kidnapping.**  
+    - **Public Safety Violations, Corruption, Criminal Breach of Trust.**  
+
+    ####Both Civil & Criminal Laws Apply When:
+    The case has **both a personal dispute (civil)** AND **an offense punishable under criminal law**.  
+    Examples include:  
+    - **Bigamy:** A civil marriage dispute + IPC 494 for criminal bigamy.  
+    - **Domestic Violence:** Divorce & protection orders (civil) + Assault or cruelty (criminal).  
+    - **Fraud in Business:** Contract disputes (civil) + Financial fraud or misrepresentation (criminal).  
+    - **Sexual Harassment at Work:** Workplace rights violation (civil) + Criminal punishment for sexual offenses.  
+
+"""
+
+
+def expect_one_of(answers):
+    """Returns a response validator that raises ValueError unless the answer is one of `answers`."""
+    def validate(response):
+        if response.strip() not in answers:
+            raise ValueError(f"Unexpected answer: {response.strip()!r}")
+    return validate
+
+
+def check_safety(query: str, use_cache: bool = True) -> str:
+    """
+    Uses OpenAI LLM to check if the query is safe to process.
+
+    :param query: User's input legal question.
+    :param use_cache: False to send the request even if its response is cached.
+    :return: "Safe" OR a safety warning.
+    """
+    safety_prompt = f"""
+    You are a legal AI assistant. Your first task is to analyze whether this query is **safe to process** or if it requires ethical intervention.
+
+{SAFETY_GUIDELINES}    ### **Query:**  
     "{query}"
 
     ### **📌 Response Format (STRICTLY FOLLOW THIS)**
@@ -38,14 +106,32 @@ def classify_legal_domain(query: str) -> str:
     - If Not Applicable to Indian Law: Not Applicable in Indian Law.
     """
 
-    safety_response = openai.chat.completions.create(
+    safety_response = chat_completion(
+        stage="safety",
         model="gpt-3.5-turbo",
         messages=[{"role": "system", "content": "You are a legal safety filter ensuring queries are ethical and appropriate."},
                   {"role": "user", "content": safety_prompt}],
-        temperature=0.1
+        temperature=0.1,
+        use_cache=use_cache,
+        validate=expect_one_of(SAFETY_VERDICTS)
     )
 
-    safety_check = safety_response.choices[0].message.content.strip()
+    return safety_response.strip()
+
+
+def classify_two_call(query: str, use_cache: bool = True) -> str:
+    """
+    Uses OpenAI LLM to:
+    1. **Check if the query is safe to process.**
+    2. **Classify the legal domain (Civil Law, Criminal Law, Both, or NA).**
+
+    :param query: User's input legal question.
+    :param use_cache: False to send both requests even if their responses are cached.
+    :return: Legal domain category OR a safety warning.
+    """
+
+    # **Step 1: Check for Unsafe or Improper Queries**
+    safety_check = check_safety(query, use_cache)
 
     # 🚨 **If the query is unsafe or irrelevant, return the warning immediately**
     if safety_check != "Safe":
@@ -66,36 +152,7 @@ def classify_legal_domain(query: str) -> str:
 
     ---
 
-    ### **📌 Classification Criteria (Considering ALL Indian Laws)**
-    You must analyze the query based on **legal principles** rather than specific law names:
-
-    ####Civil Law (General Law) Applies When:**
-    The case involves **private disputes** between individuals or entities.  
-    The issue relates to **personal rights & obligations** under Indian **family, property, business, labor, or consumer laws**.  
-    The resolution involves **legal remedies such as compensation, court orders, or compliance** (not punishment).  
-    Examples include:  
-    - **Marriage, Divorce, Maintenance, Child Custody.**  
-    - **Property Disputes, Inheritance, Land Ownership.**  
-    - **Business Contracts, Financial Agreements, Consumer Rights, Employment Laws.**  
-
-    ####Criminal Law Applies When:
-    The case involves **an act punishable under Indian Penal Code (IPC) or other Indian criminal laws**.  
-    The offense is legally **punishable by imprisonment, fines, or state prosecution**.  
-    The case includes elements like **fraud, violence, financial crimes, abuse, public safety violations, or cyber offenses**.  
-    Examples include:  
-    - **Murder, Theft, Fraud, Cybercrimes, Financial Crimes.**  
-    - **Sexual Harassment, Domestic Violence, Kidnapping.**  
-    - **Public Safety Violations, Corruption, Criminal Breach of Trust.**  
-
-    ####Both Civil & Criminal Laws Apply When:
-    The case has **both a personal dispute (civil)** AND **an offense punishable under criminal law**.  
-    Examples include:  
-    - **Bigamy:** A civil marriage dispute + IPC 494 for criminal bigamy.  
-    - **Domestic Violence:** Divorce & protection orders (civil) + Assault or cruelty (criminal).  
-    - **Fraud in Business:** Contract disputes (civil) + Financial fraud or misrepresentation (criminal).  
-    - **Sexual Harassment at Work:** Workplace rights violation (civil) + Criminal punishment for sexual offenses.  
-
-    ---
+{CLASSIFICATION_CRITERIA}    ---
 
 
 
@@ -113,19 +170,207 @@ def classify_legal_domain(query: str) -> str:
     """
 
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
+        stage="classification",
         model="gpt-3.5-turbo",  # Use "gpt-3.5-turbo" if you prefer a cheaper option
         messages=[{"role": "system", "content": "You are a Indian legal classifier."},
                   {"role": "user", "content": prompt}],
-        temperature=0.1  # Keep deterministic classification
+        temperature=0.1,  # Keep deterministic classification
+        use_cache=use_cache,
+        validate=expect_one_of(LAW_TYPES)
     )
 
     # return response["choices"][0]["message"]["content"].strip()
-    return response.choices[0].message.content
+    return response
+
+
+def parse_verdict(raw: str) -> str:
+    """
+    Strictly parses the single-call verdict: a JSON object with exactly the keys
+    "safety" and "law_type", a known safety verdict, and a known law type when safe.
+
+    :return: Legal domain category OR a safety warning, as `classify_two_call` returns them.
+    :raises ValueError: If the response deviates from that format in any way.
+    """
+    try:
+        verdict = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Verdict is not valid JSON: {e}") from e
+
+    if not isinstance(verdict, dict) or set(verdict) != {"safety", "law_type"}:
+        raise ValueError(f"Verdict must have exactly the keys 'safety' and 'law_type': {raw!r}")
+    if verdict["safety"] not in SAFETY_VERDICTS:
+        raise ValueError(f"Unknown safety verdict: {verdict['safety']!r}")
+    if verdict["safety"] != "Safe":
+        return verdict["safety"]
+    if verdict["law_type"] not in LAW_TYPES:
+        raise ValueError(f"Unknown law type: {verdict['law_type']!r}")
+    return verdict["law_type"]
+
+
+def classify_single_call(query: str, use_cache: bool = True) -> str:
+    """
+    Runs the safety gate and the domain classification in one LLM round trip, asking
+    for a JSON verdict instead of two free-text answers.
+
+    :raises ValueError: If the response is not a well-formed verdict (see `parse_verdict`).
+    """
+    verdict_list = "\n".join(f'    - "{verdict}"' for verdict in SAFETY_VERDICTS)
+    prompt = f"""
+    You are an **Indian legal assistant**. Analyze the query below in two steps.
+
+    **Step 1: Safety.** Decide whether the query is **safe to process** or requires ethical intervention.
+
+{SAFETY_GUIDELINES}    **Step 2: Classification (ONLY if Step 1 is "Safe").** Classify the query **ONLY based on Indian laws**:
+    - **"civil_law"**, **"criminal_law"**, **"both"**, or **"na"** if the area of law does not exist in India.
+
+{CLASSIFICATION_CRITERIA}    ---
+
+    ### **Query:**  
+    "{query}"  
+
+    ### **📌 Response Format (STRICTLY FOLLOW THIS)**
+    Return only a JSON object with exactly two keys, no extra text:
+    {{"safety": <one of the verdicts below>, "law_type": <"civil_law", "criminal_law", "both", "na", or null if not Safe>}}
+    Safety verdicts:
+{verdict_list}
+    """
+
+    response = chat_completion(
+        stage="classification",
+        model="gpt-3.5-turbo",
+        messages=[{"role": "system", "content": "You are a legal safety filter and Indian legal classifier."},
+                  {"role": "user", "content": prompt}],
+        temperature=0.1,
+        response_format={"type": "json_object"},
+        use_cache=use_cache,
+        validate=parse_verdict  # A verdict that doesn't parse is never replayed from the cache
+    )
+    return parse_verdict(response.strip())
+
+
+def start_safety_check(query: str, use_cache: bool = True) -> str:
+    """
+    Starts the safety check of a query in the background, or joins the same query's
+    check if one is already running.
+
+    :return: A handle for this request only; pass it to `await_safety_check`.
+    """
+    key = (query, use_cache)
+    with _pending_safety_lock:
+        pending = _inflight_safety.get(key)
+        if pending is None:
+            pending = _inflight_safety[key] = safety_pool.submit(check_safety, query, use_cache)
+        handle = uuid.uuid4().hex
+        _pending_safety[handle] = pending
+
+    def finished(done):
+        with _pending_safety_lock:
+            if _inflight_safety.get(key) is done:
+                del _inflight_safety[key]
+
+    # Outside the lock: the callback runs at once if the check has already finished
+    pending.add_done_callback(finished)
+    return handle
+
+
+def await_safety_check(handle: str) -> str:
+    """
+    Waits for the verdict of the safety check started under `handle`.
+
+    :return: "Safe" OR a safety warning.
+    :raises KeyError: if no check is pending under the handle (never assumed safe).
+    """
+    with _pending_safety_lock:
+        pending = _pending_safety.pop(handle, None)
+    if pending is None:
+        raise KeyError(f"No safety check pending under handle {handle!r}")
+    return pending.result()
+
+
+def classify_deferring_safety(query: str, mode: str = CLASSIFICATION_MODE, use_cache: bool = True, use_local: bool = DOMAIN_CLASSIFIER_ENABLED):
+    """
+    Classifies a query's legal domain without waiting for the safety gate of a confident
+    local label: its check keeps running, so the caller can retrieve in the meantime.
+
+    :return: (Legal domain category OR a safety warning, safety check handle). The handle
+             is None when the LLM already gated the query; otherwise the caller must get
+             the verdict from `await_safety_check(handle)` before generating an answer.
+    """
+    if mode not in CLASSIFICATION_MODES:
+        raise ValueError(f"Unknown classification mode '{mode}'. Choose from {CLASSIFICATION_MODES}.")
+
+    if use_local:
+        law_type = classify_locally(query)
+        if law_type is not None:
+            # The safety gate always goes to the LLM; only the domain label is decided locally
+            return law_type, start_safety_check(query, use_cache)
+
+    if mode == "single":
+        try:
+            return classify_single_call(query, use_cache), None
+        except ValueError as e:
+            print(f"⚠️ Single-call classification failed ({e}), falling back to two calls")
+    return classify_two_call(query, use_cache), None
+
+
+def classify_legal_domain(query: str, mode: str = CLASSIFICATION_MODE, use_cache: bool = True, use_local: bool = DOMAIN_CLASSIFIER_ENABLED) -> str:
+    """
+    Checks a query's safety and classifies its legal domain.
+
+    :param query: User's input legal question.
+    :param mode: "single" (one merged LLM call, falling back to two calls if its verdict
+                 doesn't parse) or "two_call" (safety gate, then classification).
+    :param use_cache: False to bypass the LLM response cache.
+    :param use_local: Try the local embedding classifier first; the LLM classifies only
+                      when it is not confident.
+    :return: Legal domain category OR a safety warning.
+    """
+    classification, safety_handle = classify_deferring_safety(query, mode, use_cache, use_local)
+    if safety_handle is None:
+        return classification
+    safety_check = await_safety_check(safety_handle)
+    return classification if safety_check == "Safe" else safety_check
+
+
+def benchmark_classification(queries=BENCHMARK_QUERIES, repeats=1):
+    """
+    Times both classification modes on the same queries with the response cache
+    bypassed, so every call goes over the network.
+
+    :return: dict of per-mode median and mean latency (ms per query), the latency the
+             single-call mode saves, and how many single-call labels match the two-call ones.
+    """
+    latencies = {mode: [] for mode in CLASSIFICATION_MODES}
+    labels = {mode: [] for mode in CLASSIFICATION_MODES}
+    for _ in range(repeats):
+        for query in queries:
+            for mode in CLASSIFICATION_MODES:
+                started = time.perf_counter()
+                labels[mode].append(classify_legal_domain(query, mode, use_cache=False, use_local=False))
+                latencies[mode].append((time.perf_counter() - started) * 1000)
+
+    report = {"queries": len(queries) * repeats}
+    for mode in CLASSIFICATION_MODES:
+        report[f"{mode}_median_ms"] = statistics.median(latencies[mode])
+        report[f"{mode}_mean_ms"] = statistics.mean(latencies[mode])
+    report["saved_median_ms"] = report["two_call_median_ms"] - report["single_median_ms"]
+    report["saved_mean_ms"] = report["two_call_mean_ms"] - report["single_mean_ms"]
+    report["matching_labels"] = sum(a == b for a, b in zip(labels["single"], labels["two_call"]))
+    return report
 
 
 # Example Usage
 if __name__ == "__main__":
-    example_query = input("Enter your legal query: ")
-    result = classify_legal_domain(example_query)
-    print(f"{result}")  # Output: "civil_law", "criminal_law", "both", "na", or a safety warning.
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Classify a legal query, or benchmark the classification modes.")
+    parser.add_argument("--mode", choices=CLASSIFICATION_MODES, default=CLASSIFICATION_MODE, help="Classification mode.")
+    parser.add_argument("--benchmark", action="store_true", help="Time both modes on sample queries (cache bypassed).")
+    parser.add_argument("--repeats", type=int, default=1, help="Benchmark passes over the sample queries.")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark_classification(repeats=args.repeats), indent=4))
+    else:
+        example_query = input("Enter your legal query: ")
+        result = classify_legal_domain(example_query, args.mode)
+        print(f"{result}")  # Output: "civil_law", "criminal_law", "both", "na", or a safety warning.
\ No newline at end of file
@@ -1,27 +1,12 @@
-import openai
-import os
 import re
 import json
-from dotenv import load_dotenv
-from transformers import AutoModel, AutoTokenizer
 import torch
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from retrieval.embedding_cache import get_embedding_cache
+from model_registry import embedding_cache_id, get_model
+from agents.llm_gateway import chat_completion
 
-# Load API Key from .env file and set it
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize OpenAI client
-openai.api_key = OPENAI_API_KEY
-
-# Explicitly specify OpenAI API type
-openai.api_type = "openai"  # Fix for ambiguous module client error
-
-# Load bge-m3 model and tokenizer
-model_name = "BAAI/bge-m3"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name)
 
 def detect_hallucination(cosine_similarity_score, groundness_score):
     """
@@ -36,16 +21,32 @@ def detect_hallucination(cosine_similarity_score, groundness_score):
         return("❌ Hallucinated Response")
 
 
+def encode_mean_pooled(texts):
+    """
+    Encodes texts one at a time with bge-m3 and mean pooling, using the transformer and
+    tokenizer inside the shared retrieval model instead of loading a second copy.
+    """
+    sentence_model = get_model("bge-m3")
+    tokenizer = sentence_model.tokenizer
+    model = sentence_model[0].auto_model
+    embeddings = []
+    for text in texts:
+        inputs = tokenizer(text, padding=True, truncation=True, return_tensors="pt")
+
+        with torch.no_grad():
+            model_output = model(**inputs)
+
+        # Use mean pooling (recommended for BGE models)
+        embedding = model_output.last_hidden_state.mean(dim=1)  # Shape: (1, hidden_dim)
+        embeddings.append(embedding.squeeze().numpy())  # Convert to NumPy array
+    return np.stack(embeddings)
+
+
 def get_bge_m3_embedding(text):
-    """Encodes a given text into an embedding using bge-m3."""
-    inputs = tokenizer(text, padding=True, truncation=True, return_tensors="pt")
-    
-    with torch.no_grad():
-        model_output = model(**inputs)
-    
-    # Use mean pooling (recommended for BGE models)
-    embedding = model_output.last_hidden_state.mean(dim=1)  # Shape: (1, hidden_dim)
-    return embedding.squeeze().numpy()  # Convert to NumPy array
+    """Encodes a given text into an embedding using bge-m3, reusing cached embeddings."""
+    # Mean-pooled vectors differ from the retrieval model's, so they are cached under their own id
+    embedding_cache = get_embedding_cache(f"{embedding_cache_id('bge-m3')}#mean-pooling", get_model("bge-m3").get_sentence_embedding_dimension())
+    return embedding_cache.encode([text], encode_mean_pooled)[0]
 
 
 def cosine_similarity_func(question, response):
@@ -61,6 +62,14 @@ def cosine_similarity_func(question, response):
     return cosine_sim[0][0]
 
 
+def parse_llm_score(raw_output):
+    """Extracts the score from a judge's answer; raises ValueError if it has none."""
+    match = re.search(r"(\d+\.\d{1,2})", raw_output.strip())
+    if not match:
+        raise ValueError(f"No score in LLM output: {raw_output!r}")
+    return float(match.group(1))
+
+
 def generate_llm_score(system_prompt, user_input):
     """
     Generic function to query an LLM (GPT-3.5 or any other model)
@@ -68,22 +77,20 @@ def generate_llm_score(system_prompt, user_input):
     """
     try:
 
-        response = openai.chat.completions.create(
+        raw_output = chat_completion(
+            stage="relevancy",
             model="gpt-3.5-turbo",
             messages=[{"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_input}],
             temperature=0.1, # Keep deterministic classification
-            max_tokens=10
+            max_tokens=10,
+            validate=parse_llm_score  # Answers without a score are not cached
         )
 
-        # Extract the response text
-        raw_output = response.choices[0].message.content.strip()
-
         # Ensure the output is strictly a float between 0.0 and 1.0
-        match = re.search(r"(\d+\.\d{1,2})", raw_output)
-        if match:
-            return float(match.group(1))  # Convert extracted number to float
-        else:
+        try:
+            return parse_llm_score(raw_output)
+        except ValueError:
             return 0.0  # Default to 0 if parsing fails (preventing errors)
 
     except Exception as e:
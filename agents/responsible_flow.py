@@ -3,8 +3,8 @@ import pandas as pd
 from presidio_analyzer import AnalyzerEngine
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import OperatorConfig
-from detoxify import Detoxify
 from transformers import pipeline
+from model_registry import get_model
 
 class ResponsibleAIPipeline:
     def __init__(self):
@@ -27,8 +27,8 @@ class ResponsibleAIPipeline:
             "Email Address": re.compile(r'\b[\w.-]+@[\w.-]+\.\w+\b')
         }
 
-        #Load Detoxify for Toxicity Detection
-        self.toxicity_model = Detoxify('original')
+        #Detoxify is shared through the model registry, so new pipelines don't reload it
+        self.toxicity_model = get_model("detoxify")
 
 
 
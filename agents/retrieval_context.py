@@ -1,71 +1,598 @@
-import chromadb
-import torch
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 from retrieval.load_collections import get_chroma_collections
-from sentence_transformers import SentenceTransformer, models
+from retrieval.chunking import join_windows
+from retrieval.section_index import load_section_indexes, lookup_sections
+from retrieval.bm25 import BM25_FILES, load_bm25_indexes
+from retrieval.manifest import MANIFEST_PATH
+from retrieval.text_store import get_text_store
+from retrieval.embedding_cache import get_embedding_cache
+from model_registry import embedding_cache_id, get_model
+from config import RETRIEVAL_SIMILARITY_FLOOR, RETRIEVAL_SCORE_GAP, RERANK_ENABLED, RERANK_CANDIDATES_PER_RESULT
 
-# Load embedding model (same as used in Phase 1)
-word_embedding_model = models.Transformer("nlpaueb/legal-bert-base-uncased", max_seq_length=512)
-pooling_model = models.Pooling(word_embedding_model.get_word_embedding_dimension(), pooling_mode_mean_tokens=True)
+# Load the vector store collections (ChromaDB or exact NumPy search, per config)
+civil_law_collection, criminal_law_collection = get_chroma_collections()
+COLLECTIONS = {"civil_law": civil_law_collection, "criminal_law": criminal_law_collection}
 
-# Combine into a SentenceTransformer model
-# embedding_model = SentenceTransformer(modules=[word_embedding_model, pooling_model])
-embedding_model = SentenceTransformer("BAAI/bge-m3")
-# Debug: Confirm Model Components
-print("✅ BAAI/bge-m3 Loaded with Custom Pooling!")
+# Searches of different collections run side by side (both backends release the GIL while searching)
+search_pool = ThreadPoolExecutor(max_workers=len(COLLECTIONS), thread_name_prefix="retrieval")
+# Speculative searches started before a query is classified get their own workers, and
+# their query embeddings others again, so an embedding never queues behind searches
+speculation_pool = ThreadPoolExecutor(max_workers=2 * len(COLLECTIONS), thread_name_prefix="speculation")
+speculative_embedding_pool = ThreadPoolExecutor(max_workers=len(COLLECTIONS), thread_name_prefix="speculative-embedding")
 
-# Load ChromaDB collections
-civil_law_collection, criminal_law_collection = get_chroma_collections()
+# (act, section number) lookup tables built at chunking time
+section_indexes = load_section_indexes()
 
-def retrieve_legal_text(query: str, law_type: str, top_k=3):
+# Lexical BM25 indexes fused with the dense ranking by reciprocal rank fusion
+bm25_indexes = load_bm25_indexes()
+HYBRID_SEARCH = True  # Fuse BM25 with dense retrieval when a collection has a BM25 index
+RRF_K = 60  # Rank offset of reciprocal rank fusion; larger values flatten the contribution of top ranks
+
+# Long sections are indexed as overlapping windows; these are collapsed back per section
+WINDOW_OVERFETCH = 3  # Candidates fetched per requested result to absorb sibling windows
+PARENT_MAX_WINDOWS = 4  # Sections with at most this many windows are returned whole
+
+# Two-level query cache: exact-text query embeddings, then results of near-identical queries
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Query embeddings kept in memory (LRU)
+SEMANTIC_CACHE_SIZE = 512  # Cached result sets per (law types, top_k) scope (LRU)
+SEMANTIC_CACHE_THRESHOLD = 0.97  # Cosine similarity above which a cached query's results are reused
+QUERY_BATCH_SIZE = 32  # Queries encoded per padded batch in batch retrieval
+RERANK_BATCH_SIZE = 32  # (query, section) pairs scored per cross-encoder batch
+SPECULATION_MAX_PENDING = 64  # Speculative retrievals kept waiting for their query's label
+
+
+def collection_version():
+    """
+    Identifies the indexed data: every embedding run rewrites the manifest and every
+    chunking run rewrites the BM25 indexes, so their modification times change with it.
+    """
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in (MANIFEST_PATH, *BM25_FILES.values()))
+
+
+class RetrievalCache:
+    """
+    L1: exact-text LRU of query embeddings, so repeated questions skip the bge-m3 pass.
+    L2: semantic result cache; a query whose embedding is within SEMANTIC_CACHE_THRESHOLD
+    cosine similarity of a cached query reuses that query's retrieved sections.
+
+    L2 is dropped whenever `collection_version()` changes; L1 only depends on the model.
+    """
+
+    def __init__(self, embedding_size=QUERY_EMBEDDING_CACHE_SIZE, result_size=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.embedding_size = embedding_size
+        self.result_size = result_size
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.embeddings = OrderedDict()  # Query text → embedding
+        self.results = {}  # Scope → OrderedDict(query text → (unit embedding, hits))
+        self.version = collection_version()
+        self.counters = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0}
+
+    def sync_version(self):
+        """Drops cached results if the collections were re-indexed since they were stored."""
+        version = collection_version()
+        with self.lock:
+            if version != self.version:
+                self.results.clear()
+                self.version = version
+
+    def embeddings_for(self, queries, encode_fn):
+        """
+        Returns the queries' embeddings in input order, computing the L1 misses with one
+        `encode_fn(list of queries)` call.
+        """
+        found = {}
+        with self.lock:
+            for query in queries:
+                if query in self.embeddings:
+                    self.embeddings.move_to_end(query)
+                    found[query] = self.embeddings[query]
+            missing = list(dict.fromkeys(query for query in queries if query not in found))
+            self.counters["embedding_hits"] += len(queries) - len(missing)
+            self.counters["embedding_misses"] += len(missing)
+
+        if missing:
+            vectors = np.asarray(encode_fn(missing), dtype=np.float32)
+            found.update(zip(missing, vectors))
+            with self.lock:
+                self.embeddings.update(zip(missing, vectors))
+                while len(self.embeddings) > self.embedding_size:
+                    self.embeddings.popitem(last=False)
+
+        return [found[query] for query in queries]
+
+    def get_results(self, scope, embedding):
+        """Returns a copy of the hits of the most similar cached query in scope, or None."""
+        unit = embedding / max(np.linalg.norm(embedding), 1e-12)
+        with self.lock:
+            entries = self.results.get(scope)
+            if entries:
+                queries = list(entries)
+                similarities = np.stack([entries[cached][0] for cached in queries]) @ unit
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entries.move_to_end(queries[best])
+                    self.counters["result_hits"] += 1
+                    return [dict(hit) for hit in entries[queries[best]][1]]
+            self.counters["result_misses"] += 1
+            return None
+
+    def put_results(self, scope, query, embedding, hits):
+        unit = embedding / max(np.linalg.norm(embedding), 1e-12)
+        with self.lock:
+            entries = self.results.setdefault(scope, OrderedDict())
+            entries[query] = (unit, [dict(hit) for hit in hits])
+            while len(entries) > self.result_size:
+                entries.popitem(last=False)
+
+    def stats(self):
+        """Returns the hit counters and hit rates of both levels."""
+        with self.lock:
+            stats = dict(self.counters)
+        for level in ("embedding", "result"):
+            lookups = stats[f"{level}_hits"] + stats[f"{level}_misses"]
+            stats[f"{level}_hit_rate"] = stats[f"{level}_hits"] / lookups if lookups else 0.0
+        return stats
+
+
+retrieval_cache = RetrievalCache()
+
+
+class StageTimer:
+    """Wall-clock time per retrieval stage for one call, also accumulated for the process."""
+
+    totals = {}  # Stage → [seconds, calls] since start-up
+    totals_lock = threading.Lock()
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            with StageTimer.totals_lock:
+                total = StageTimer.totals.setdefault(name, [0.0, 0])
+                total[0] += elapsed
+                total[1] += 1
+
+    def milliseconds(self):
+        return {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()}
+
+    @classmethod
+    def averages(cls):
+        """Returns the mean milliseconds per call of every stage since start-up."""
+        with cls.totals_lock:
+            return {name: round(seconds * 1000 / calls, 1) for name, (seconds, calls) in cls.totals.items()}
+
+
+def embed_queries(queries):
+    """
+    Embeds queries with the shared bge-m3 model (same model and pooling as the index
+    build) in padded batches, reusing the persistent embedding cache.
+    """
+    embedding_model = get_model("bge-m3")
+    query_cache = get_embedding_cache(embedding_cache_id("bge-m3"), embedding_model.get_sentence_embedding_dimension())
+    return query_cache.encode(queries, lambda texts: embedding_model.encode(texts, batch_size=QUERY_BATCH_SIZE, convert_to_numpy=True))
+
+
+def stitch_windows(law_type, parent_id, hits):
+    """
+    Rebuilds the text of a section from its window hits, dropping the overlap between
+    consecutive windows. Short sections are fetched whole; for very long ones only the
+    matched windows are joined so the LLM prompt stays bounded.
+
+    Window texts are read from the collection's text store; metadata written before
+    the text store existed still carries them inline.
+    """
+    collection = COLLECTIONS[law_type]
+    windows = hits
+    if 1 < hits[0].get("window_count", 1) <= PARENT_MAX_WINDOWS:
+        fetched = collection.get(where={"parent_id": parent_id}, include=["metadatas"])
+        windows = [dict(metadata, id=chunk_id) for chunk_id, metadata in zip(fetched["ids"], fetched["metadatas"])]
+
+    texts = get_text_store(collection.name).get_many([window["id"] for window in windows if "text" not in window])
+    windows = [window if "text" in window else dict(window, text=texts.get(window["id"], "")) for window in windows]
+
+    if windows[0].get("window_count", 1) == 1:
+        return windows[0]["text"] or "No text found"
+    return join_windows(windows)
+
+
+def attach_texts(hits):
+    """Reads the text of the final hits only, after ranking and filtering."""
+    for hit in hits:
+        hit["text"] = stitch_windows(hit["law_type"], hit["id"], hit["windows"])
+    return hits
+
+
+def cosine_similarities(query_embedding, embeddings):
+    """Returns the cosine similarity of a query vector to each row of `embeddings`."""
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, len(query_embedding))
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
+    return embeddings @ query_embedding / np.maximum(norms, 1e-12)
+
+
+def rank_parents(ids, metadatas):
+    """Groups ranked window hits by parent section, in order of each section's best hit."""
+    parents = {}
+    for chunk_id, metadata in zip(ids, metadatas):
+        parents.setdefault(metadata.get("parent_id", chunk_id), []).append(dict(metadata, id=chunk_id))
+    return parents
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuses ranked lists of ids into {id: sum of 1 / (k + rank)} (ranks start at 1)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def rank_collection_hits(law_type, query, query_embedding, ids, metadatas, distances, top_k):
+    """
+    Ranks the dense results of one query against one collection, fused with its BM25
+    ranking when a lexical index exists, and returns the top `top_k` sections without
+    their text (see `attach_texts`).
+
+    Each hit carries "similarity" (cosine similarity of its best matched window) and
+    "score", the ranking score: the fused RRF score with a BM25 index, the similarity
+    without one.
+    """
+    collection = COLLECTIONS[law_type]
+    dense = rank_parents(ids, metadatas)
+    similarities = {}
+    for chunk_id, metadata, distance in zip(ids, metadatas, distances):
+        similarities.setdefault(metadata.get("parent_id", chunk_id), 1.0 - distance)
+
+    bm25_index = bm25_indexes.get(law_type) if HYBRID_SEARCH else None
+    lexical = {}
+    if bm25_index is None:
+        scores = similarities
+    else:
+        for chunk_id, parent_id, _ in bm25_index.search(query, top_k * WINDOW_OVERFETCH):
+            lexical.setdefault(parent_id, []).append(chunk_id)
+        scores = reciprocal_rank_fusion([list(dense), list(lexical)])
+
+    hits = []
+    for parent_id in sorted(scores, key=scores.get, reverse=True)[:top_k]:
+        windows = dense.get(parent_id)
+        if windows is None:
+            # Sections only BM25 found have their matched windows fetched by id and scored here
+            fetched = collection.get(ids=lexical[parent_id], include=["metadatas", "embeddings"])
+            windows = [dict(metadata, id=chunk_id) for chunk_id, metadata in zip(fetched["ids"], fetched["metadatas"])]
+            similarities[parent_id] = cosine_similarities(query_embedding, fetched["embeddings"]).max(initial=-1.0)
+        hits.append({
+            "id": parent_id,
+            "windows": windows,  # Matched windows; their text is read once the final hits are known
+            "score": scores[parent_id],
+            "similarity": float(similarities[parent_id]),
+            "law_type": law_type,
+        })
+    return hits
+
+
+def search_collection(law_type, queries, query_embeddings, top_k):
+    """
+    Searches one collection for several queries with a single multi-vector query and
+    returns each query's ranked sections, in input order.
+    """
+    results = COLLECTIONS[law_type].query(
+        query_embeddings=query_embeddings,
+        n_results=top_k * WINDOW_OVERFETCH,  # Over-fetch so sibling windows don't crowd out other sections
+        include=["metadatas", "distances"]
+    )
+    return [
+        rank_collection_hits(law_type, query, query_embedding, ids, metadatas, distances, top_k)
+        for query, query_embedding, ids, metadatas, distances
+        in zip(queries, query_embeddings, results["ids"], results["metadatas"], results["distances"])
+    ]
+
+
+def candidate_count(top_k):
+    """Candidates retrieved per query: with reranking, a wider set the cross-encoder picks top_k from."""
+    return top_k * RERANK_CANDIDATES_PER_RESULT if RERANK_ENABLED else top_k
+
+
+class SpeculativeRetrieval:
+    """
+    Searches every collection for a query before its law type is known, so the searches
+    overlap the classification round trip. Once the label arrives, `collect()` returns
+    the searched collections' hits and cancels (or ignores) the rest.
+    """
+
+    def __init__(self, query, top_k, embed_now=False):
+        self.query = query
+        self.top_k = top_k
+        # Embedded through the query cache, in the background so the caller goes on to
+        # classify straight away, or right here when the caller needs the vector at once
+        if embed_now:
+            self.embedding = Future()
+            self.embedding.set_result(retrieval_cache.embeddings_for([query], embed_queries)[0])
+        else:
+            self.embedding = speculative_embedding_pool.submit(lambda: retrieval_cache.embeddings_for([query], embed_queries)[0])
+        self.searches = {name: speculation_pool.submit(self.search, name) for name in COLLECTIONS}
+
+    def search(self, name):
+        return search_collection(name, [self.query], [self.embedding.result().tolist()], candidate_count(self.top_k))
+
+    def collect(self, law_types):
+        """Returns {law type: ranked hits} for the requested collections whose search succeeded."""
+        hits = {}
+        for name, future in self.searches.items():
+            if name not in law_types:
+                future.cancel()
+                continue
+            try:
+                hits[name] = future.result()[0]
+            except Exception as e:
+                print(f"⚠️ Speculative search of {name} failed ({e}), searching again")
+        return hits
+
+    def discard(self):
+        for future in self.searches.values():
+            future.cancel()
+
+
+_speculations = OrderedDict()  # (query, top_k) → SpeculativeRetrieval
+_speculations_lock = threading.Lock()
+
+
+def start_speculative_retrieval(query, top_k=3, embed_now=False):
+    """
+    Starts searching both collections for a query whose law type is still being
+    classified. The next `retrieve_legal_text` call for the same query and top_k uses
+    these results for the collections of its law type instead of searching again.
+
+    With `embed_now` the query is embedded on the calling thread (e.g. when the local
+    domain classifier is about to need the vector anyway); otherwise in the background.
+    """
+    speculation = SpeculativeRetrieval(query, top_k, embed_now)
+    with _speculations_lock:
+        previous = _speculations.pop((query, top_k), None)
+        _speculations[(query, top_k)] = speculation
+        stale = [_speculations.popitem(last=False)[1] for _ in range(len(_speculations) - SPECULATION_MAX_PENDING)]
+    for unused in filter(None, [previous, *stale]):
+        unused.discard()
+    return speculation
+
+
+def take_speculation(query, top_k):
+    """Removes and returns the pending speculative retrieval of a query, if any."""
+    with _speculations_lock:
+        return _speculations.pop((query, top_k), None)
+
+
+def discard_speculation(query, top_k=3):
+    """Drops a query's speculative retrieval, e.g. when classification rules out retrieval."""
+    speculation = take_speculation(query, top_k)
+    if speculation is not None:
+        speculation.discard()
+
+
+def query_embedding(query):
+    """
+    Returns a query's embedding, waiting for a speculative retrieval that is already
+    embedding it rather than encoding the query a second time.
     """
-    Retrieves the most relevant legal text from ChromaDB based on the query.
+    with _speculations_lock:
+        pending = [speculation.embedding for (speculated, _), speculation in _speculations.items() if speculated == query]
+    if pending:
+        try:
+            return pending[-1].result()
+        except Exception as e:
+            print(f"⚠️ Speculative query embedding failed ({e}), embedding again")
+    return retrieval_cache.embeddings_for([query], embed_queries)[0]
+
+
+def merge_by_similarity(result_lists, top_k):
+    """
+    Merges per-collection results into one top_k list by cosine similarity. Every collection
+    is guaranteed its top_k // len(result_lists) best-ranked hits so one corpus can't
+    crowd out the other; the remaining places go to the most similar hits overall.
+
+    Hits are compared on their cosine similarity, which is on one scale in every
+    collection, not on "score": a collection with a BM25 index is ranked by RRF (~0.03)
+    and one without by cosine (~0.6).
+    """
+    def key(hit):
+        return hit["similarity"]
+
+    quota = top_k // len(result_lists)
+    merged = [hit for hits in result_lists for hit in hits[:quota]]
+    leftovers = sorted((hit for hits in result_lists for hit in hits[quota:]), key=key, reverse=True)
+    merged += leftovers[:top_k - len(merged)]
+    return sorted(merged, key=key, reverse=True)
+
+
+def rerank(query_hits):
+    """
+    Reorders each query's candidates by cross-encoder relevance, scoring every
+    (query, section) pair of the batch in one batched CPU inference call.
 
     Args:
-        query (str): The user's legal question.
-        law_type (str): "general_law" for Family + Civil Law, "criminal_law" for Criminal Law.
-        top_k (int): Number of relevant chunks to retrieve.
+        query_hits (iterable[tuple[str, list[dict]]]): Queries and their candidate hits,
+            which must already carry their text; the lists are sorted in place.
+    """
+    query_hits = [(query, hits) for query, hits in query_hits if hits]
+    pairs = [(query, hit["text"]) for query, hits in query_hits for hit in hits]
+    if not pairs:
+        return
+
+    scores = iter(get_model("reranker").predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False))
+    for _, hits in query_hits:
+        for hit in hits:
+            hit["rerank_score"] = float(next(scores))
+        hits.sort(key=lambda hit: hit["rerank_score"], reverse=True)
+
+
+def apply_score_floor(hits, floor=RETRIEVAL_SIMILARITY_FLOOR):
+    """Keeps only grounded hits: those at least `floor` similar to the query. Rank order is preserved."""
+    return [hit for hit in hits if hit["similarity"] >= floor]
+
+
+def cut_at_score_gap(hits, max_gap=RETRIEVAL_SCORE_GAP):
+    """
+    Cuts the final hits at the first drop of more than `max_gap` between consecutive
+    similarities, so a clear winner isn't padded with weak matches. Rank order is preserved.
+
+    Applied to the returned top_k after reranking: cutting the whole candidate set would
+    leave the cross-encoder little or nothing to reorder.
+    """
+    similarities = sorted((hit["similarity"] for hit in hits), reverse=True)
+    for higher, lower in zip(similarities, similarities[1:]):
+        if higher - lower > max_gap:
+            return [hit for hit in hits if hit["similarity"] >= higher]
+    return hits
+
+
+def resolve_law_types(law_type):
+    """Returns the collections searched for a classified law type."""
+    if law_type == "both":
+        return list(COLLECTIONS)
+    if law_type in COLLECTIONS:
+        return [law_type]
+    raise ValueError("Invalid law type! Choose 'civil_law', 'criminal_law' or 'both'.")
+
+
+def format_hits(hits):
+    return [{"text": hit["text"], "score": hit["score"], "similarity": hit["similarity"]} for hit in hits]
+
+
+def retrieve_legal_text_batch(queries, law_types, top_k=3):
+    """
+    Retrieves legal text for many queries in one call.
+
+    Section-number queries are answered from the section index and near-duplicates of
+    earlier queries from the semantic cache. The remaining queries are encoded in
+    padded batches, grouped by collection, and each collection is searched once with
+    all of its query vectors (collections concurrently). With RERANK_ENABLED, a wider
+    candidate set is rescored by a local cross-encoder and only its top_k are kept.
+    Collections already searched by `start_speculative_retrieval` for the same query
+    and top_k are taken from the speculation rather than searched again.
+    Stage timings are printed per call and accumulated in `StageTimer.averages()`.
+
+    Args:
+        queries (list[str]): The legal questions.
+        law_types (list[str] | str): Law type per query, or one law type for all of them.
+        top_k (int): Number of relevant sections to retrieve per query.
 
     Returns:
-        list[dict]: List of retrieved legal text chunks with metadata.
-    """
-    # Select correct collection
-    if law_type == "civil_law":
-        collection = civil_law_collection
-    elif law_type == "criminal_law":
-        collection = criminal_law_collection
-    elif law_type == "both":
-        collection = civil_law_collection
-        collection = criminal_law_collection
-    else:
-        raise ValueError("Invalid law type! Choose 'civil_law' or 'criminal_law'.")
+        list[list[dict]]: Retrieved sections as {"text", "score", "similarity"} per query,
+        in input order. Hits below the similarity floor are dropped, so a query with no
+        grounded context gets an empty list.
+    """
+    if isinstance(law_types, str):
+        law_types = [law_types] * len(queries)
+    if len(law_types) != len(queries):
+        raise ValueError("Expected one law type per query.")
 
-    # Convert query into embedding
-    
-    query_embedding = embedding_model.encode(query, convert_to_tensor=True).tolist()
+    searched = [resolve_law_types(law_type) for law_type in law_types]
+    results = [None] * len(queries)
+    speculations = {i: take_speculation(query, top_k) for i, query in enumerate(queries)}
 
-    # Debugging: Print Query Embedding
-    # print("✅ Query Embedding Shape:", len(query_embedding))
-    # print("✅ Query Embedding Sample Values:", query_embedding[:10])  # Print first 10 values
+    # Queries that name a section outright ("Section 376 IPC") skip the vector search
+    for i, query in enumerate(queries):
+        section_hits = lookup_sections(query, section_indexes, top_k)
+        if section_hits:
+            print(f"✅ Retrieval complete from section index: {[hit['id'] for hit in section_hits]}")
+            # Exact section matches are grounded by definition
+            results[i] = [{"text": hit["text"], "score": 1.0, "similarity": 1.0} for hit in section_hits]
 
+    pending = [i for i in range(len(queries)) if results[i] is None]
+    for i in range(len(queries)):
+        if results[i] is not None and speculations[i] is not None:
+            speculations[i].discard()
+    if not pending:
+        return results
 
-    # Perform similarity search in ChromaDB
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k  # Retrieve top-k most relevant results
-    )
-    
-    # print("✅ Raw ChromaDB Query Results:", results)
-    
-    # Format output
-    retrieved_texts = []
-    for i in range(len(results["metadatas"][0])):
-        retrieved_texts.append({
-            "text": results["metadatas"][0][i].get("text", "No text found"),
-            # "source": results["metadatas"][0][i].get("source", "Unknown Source"),
-            # "confidence_score": round(100 - (i * (100 / top_k)), 2)  # Assign a confidence score
-        })
+    timer = StageTimer()
+
+    # Convert queries into embeddings (once per query, whatever the number of collections searched)
+    with timer.stage("embed"):
+        retrieval_cache.sync_version()
+        embeddings = dict(zip(pending, retrieval_cache.embeddings_for([queries[i] for i in pending], embed_queries)))
+
+    # A near-identical earlier question against the same collections reuses its sections
+    for i in list(pending):
+        hits = retrieval_cache.get_results((tuple(searched[i]), top_k), embeddings[i])
+        if hits is not None:
+            print(f"✅ Retrieval complete from semantic cache: {retrieval_cache.stats()}")
+            results[i] = format_hits(hits)
+            pending.remove(i)
+            if speculations[i] is not None:
+                speculations[i].discard()
 
-    
-    print("✅ Retrieval complete")
+    # With reranking, a wider candidate set is retrieved and the cross-encoder picks the final top_k
+    candidate_k = candidate_count(top_k)
 
-    return retrieved_texts
+    # Perform similarity search: one multi-vector query per collection, collections in parallel.
+    # Collections a speculative retrieval already searched for the query are not searched again.
+    with timer.stage("search"):
+        prefetched = {i: speculations[i].collect(searched[i]) if speculations[i] is not None else {} for i in pending}
+        by_collection = {name: [i for i in pending if name in searched[i] and name not in prefetched[i]] for name in COLLECTIONS}
+        futures = {
+            name: search_pool.submit(search_collection, name, [queries[i] for i in members], [embeddings[i].tolist() for i in members], candidate_k)
+            for name, members in by_collection.items() if members
+        }
+        collection_hits = {name: dict(zip(by_collection[name], future.result())) for name, future in futures.items()}
+
+        candidates = {}
+        for i in pending:
+            per_collection = [prefetched[i][name] if name in prefetched[i] else collection_hits[name][i] for name in searched[i]]
+            hits = per_collection[0] if len(per_collection) == 1 else merge_by_similarity(per_collection, candidate_k)
+            candidates[i] = apply_score_floor(hits)
+
+    with timer.stage("text"):
+        for hits in candidates.values():
+            attach_texts(hits)
+
+    if RERANK_ENABLED and pending:
+        with timer.stage("rerank"):
+            rerank([(queries[i], candidates[i]) for i in pending])
+
+    for i in pending:
+        hits = cut_at_score_gap(candidates[i][:top_k])
+        retrieval_cache.put_results((tuple(searched[i]), top_k), queries[i], embeddings[i], hits)
+        print(f"✅ Retrieval complete: {[(hit['law_type'], hit['id'], round(hit['score'], 3)) for hit in hits]}")
+        results[i] = format_hits(hits)
+
+    if pending:
+        context_chars = sum(len(hit["text"]) for i in pending for hit in results[i])
+        print(f"⏱️ Retrieval stages (ms): {timer.milliseconds()}; {context_chars} context characters for {len(pending)} queries")
+
+    return results
+
+
+def retrieve_legal_text(query: str, law_type: str, top_k=3):
+    """
+    Retrieves the most relevant legal text from the vector stores based on the query.
+
+    Dense results are fused with BM25 keyword results by reciprocal rank fusion, so exact
+    terms ("res judicata", "cognizable") rank well even when the embedding misses them.
+    For "both", the query is embedded once and both collections are searched
+    concurrently, then merged by similarity with per-collection quotas.
+
+    Args:
+        query (str): The user's legal question.
+        law_type (str): "civil_law", "criminal_law" or "both".
+        top_k (int): Maximum number of relevant sections to retrieve; fewer are returned
+            when the similarities fall off sharply.
+
+    Returns:
+        list[dict]: Retrieved legal sections as {"text", "score", "similarity"}, best first;
+        empty when nothing clears the similarity floor.
+    """
+    return retrieve_legal_text_batch([query], [law_type], top_k)[0]
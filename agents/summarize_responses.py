@@ -1,9 +1,5 @@
-import openai  # type: ignore
-import os  # For accessing environment variables
 import json
-from config import OPENAI_API_KEY
-# Set up OpenAI API Key from environment variables
-openai.api_key = OPENAI_API_KEY
+from agents.llm_gateway import chat_completion
 
 
 def call_summarizer_agent(query, top_responses, retrieved_context):
@@ -51,18 +47,18 @@ def call_summarizer_agent(query, top_responses, retrieved_context):
     Do not include additional text outside this JSON.
     """
 
-    # Call OpenAI GPT-4 API for summarization
-    client = openai.OpenAI()
-    response = client.chat.completions.create(
+    # Call OpenAI GPT-4 API for summarization (through the shared, pooled client)
+    response_content = chat_completion(
+        stage="summarization",
         model="gpt-4",
         messages=[{"role": "system", "content": prompt}],
         temperature=0.1,
         max_tokens=512,
-        n=1
+        n=1,
+        validate=json.loads  # Only well-formed JSON summaries are cached
     )
 
     # Extract and return the summarized response
-    response_content = response.choices[0].message.content.strip()
-    summarized_response = json.loads(response_content)
+    summarized_response = json.loads(response_content.strip())
 
     return summarized_response
\ No newline at end of file
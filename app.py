@@ -2,8 +2,12 @@ import streamlit as st
 from main import run_pipeline  # Import LangGraph execution function
 from agents.query_processing import classify_legal_domain
 from agents.responsible_flow import ResponsibleAIPipeline
+from model_registry import preload_pinned
 import time
 
+# Load the deployment's pinned models once per process instead of on the first question
+preload_pinned()
+
 # --- Configure Streamlit Page ---
 st.set_page_config(page_title="⚖️ Legal Chatbot", page_icon="📜", layout="wide")
 
@@ -7,6 +7,66 @@ load_dotenv()
 # Direct variable assignment
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# LLM gateway: seconds per attempt, seconds per call (all attempts and backoff), retries after
+# the first attempt, concurrent requests
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "90"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Persistent LLM response cache: entry lifetime, size cap and stages that always call the API
+# (comma-separated: safety, classification, answer, relevancy, summarization)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_DISABLED_STAGES = {stage.strip() for stage in os.getenv("LLM_CACHE_DISABLED_STAGES", "").split(",") if stage.strip()}
+
+# Safety gate + domain classification: "single" (one JSON verdict call, falling back to
+# two calls on a malformed verdict) or "two_call" (safety call, then classification call)
+CLASSIFICATION_MODE = os.getenv("CLASSIFICATION_MODE", "single")
+# Local nearest-centroid domain classifier (`python -m agents.domain_classifier` trains it);
+# below this cosine margin between the two nearest domains the LLM classifies instead
+DOMAIN_CLASSIFIER_ENABLED = os.getenv("DOMAIN_CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+DOMAIN_CLASSIFIER_MIN_MARGIN = float(os.getenv("DOMAIN_CLASSIFIER_MIN_MARGIN", "0.05"))
+
+# Embed the query and search both collections while it is classified, keeping the results of its law type
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+
+# Models kept resident by the model registry (comma-separated registry names)
+PINNED_MODELS = [name.strip() for name in os.getenv("PINNED_MODELS", "bge-m3").split(",") if name.strip()]
+
+# Inference backend of the bge-m3 encoder: "torch" (fp32), "int8" (dynamic quantization) or "onnx"
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+# Minimum cosine similarity to fp32 embeddings for a backend to pass `python model_registry.py`;
+# non-torch backends are refused until they have passed it
+ENCODER_PARITY_THRESHOLD = float(os.getenv("ENCODER_PARITY_THRESHOLD", "0.99"))
+
+# Vector store backend: "chroma" (HNSW, large corpora) or "numpy" (exact in-memory search)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+# Per-collection overrides, e.g. "civil_law_rag=numpy,criminal_law_rag=chroma"
+VECTOR_STORE_BACKENDS = dict(
+    item.strip().split("=", 1) for item in os.getenv("VECTOR_STORE_BACKENDS", "").split(",") if "=" in item
+)
+
+# First-pass index of the numpy backend: "none", "float16" or "int8" codes, optionally
+# PCA-reduced to NUMPY_STORE_PCA_DIM dimensions (0 keeps all); candidates are rescored in float32
+NUMPY_STORE_QUANTIZATION = os.getenv("NUMPY_STORE_QUANTIZATION", "none")
+NUMPY_STORE_PCA_DIM = int(os.getenv("NUMPY_STORE_PCA_DIM", "0"))
+NUMPY_STORE_RESCORE_FACTOR = int(os.getenv("NUMPY_STORE_RESCORE_FACTOR", "4"))  # Candidates rescored per requested result
+
+# Compression of the chunk text store records: "zlib" or "none"
+TEXT_STORE_COMPRESSION = os.getenv("TEXT_STORE_COMPRESSION", "zlib")
+
+# Retrieved sections less similar to the query than this (cosine) are not sent to the LLM
+RETRIEVAL_SIMILARITY_FLOOR = float(os.getenv("RETRIEVAL_SIMILARITY_FLOOR", "0.45"))
+# Similarity drop between consecutive hits at which the remaining hits are cut off
+RETRIEVAL_SCORE_GAP = float(os.getenv("RETRIEVAL_SCORE_GAP", "0.1"))
+
+# Optional cross-encoder rerank of a wider candidate set before the LLM sees it
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES_PER_RESULT = int(os.getenv("RERANK_CANDIDATES_PER_RESULT", "4"))  # Candidates retrieved per result kept
+
 # Example usage
 if __name__ == "__main__":
     print(f"Loaded OpenAI API Key: {'✔️ Loaded' if OPENAI_API_KEY else '❌ Not Found'}")
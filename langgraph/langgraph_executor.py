@@ -1,6 +1,6 @@
 from langgraph.graph import StateGraph
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from agents.completion_agents import retrieval_agent
 from agents.completion_agents import llm_agent
 from agents.completion_agents import evaluation_agent
@@ -8,6 +8,8 @@ from agents.completion_agents import query_processing_agent
 from agents.completion_agents import relevancy_agent
 from agents.completion_agents import summarization_agent
 from agents.completion_agents import responsible_ai_agent
+from agents.completion_agents import no_context_agent
+from agents.completion_agents import route_after_retrieval
 # from agents.completion_agents i
 
 # ✅ Define Agent State
@@ -16,6 +18,9 @@ class AgentState(BaseModel):
     summarized_response : str = ""
     law_type: str = "unknown"  # ✅ Default value to avoid validation errors
     retrieved_texts: List[dict] = []  # ✅ Stores retrieved legal text chunks
+    no_grounded_context: bool = False  # ✅ Set when no retrieved text clears the similarity floor
+    safety_check_handle: Optional[str] = None  # ✅ Safety check of a locally classified query, awaited by the retrieval agent
+    safety_warning: str = ""  # ✅ Set when the safety check left running during retrieval rejects the query
     llm_responses: List[dict] = []  # ✅ Stores LLM-generated responses
     evaluation_scores: List[dict] = []  # ✅ Stores scores from evaluation agent
     top_responses: List[dict] = []  # ✅ Stores top-ranked responses for fact-checking
@@ -34,19 +39,22 @@ graph.add_node("evaluation_agent", evaluation_agent)
 graph.add_node("relevancy_agent", relevancy_agent)
 graph.add_node("summarization_agent", summarization_agent)
 graph.add_node("responsible_ai_agent", responsible_ai_agent)
+graph.add_node("no_context_agent", no_context_agent)
 # ✅ Define Entry Point (Starting Node)
 
 
 graph.set_entry_point("query_processing_agent")
 # ✅ Define Graph Execution Flow
 graph.add_edge("query_processing_agent", "retrieval_agent")
-graph.add_edge("retrieval_agent", "llm_agent")
+# ✅ Without grounded context, skip generation, evaluation and summarization entirely
+graph.add_conditional_edges("retrieval_agent", route_after_retrieval, {"llm_agent": "llm_agent", "no_context_agent": "no_context_agent"})
 graph.add_edge("llm_agent", "evaluation_agent")
 graph.add_edge("evaluation_agent", "relevancy_agent")
 graph.add_edge("relevancy_agent", "summarization_agent")
 graph.add_edge("summarization_agent", "responsible_ai_agent")
 
 graph.set_finish_point("responsible_ai_agent")
+graph.set_finish_point("no_context_agent")
 
 
 # ✅ Compile Graph
@@ -0,0 +1,264 @@
+import gc
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from config import PINNED_MODELS, ENCODER_BACKEND, ENCODER_PARITY_THRESHOLD, RERANKER_MODEL
+
+# Hugging Face ids of the registered models, also used as embedding cache keys
+MODEL_IDS = {
+    "bge-m3": "BAAI/bge-m3",
+    "detoxify": "original",
+    "reranker": RERANKER_MODEL,
+}
+
+# Inference backends for the sentence encoders: fp32 PyTorch, dynamically int8-quantized
+# PyTorch (Linear layers) or an ONNX Runtime export
+ENCODER_BACKENDS = ("torch", "int8", "onnx")
+# The `backend=` argument of SentenceTransformer first shipped in sentence-transformers 3.2
+ONNX_MIN_SENTENCE_TRANSFORMERS = (3, 2)
+
+# Reports written by `python model_registry.py --backend ...`; a non-torch backend is only
+# loaded once its report shows it passed
+PARITY_REPORT_DIR = "data/encoder_parity"
+
+# Texts used for parity checks when no chunk file is available
+PARITY_SAMPLE_TEXTS = [
+    "What is the punishment for murder under the Indian Penal Code?",
+    "Grounds for divorce and maintenance of the wife",
+    "When can a court grant a temporary injunction?",
+    "Section 376 rape punishment",
+    "No Court shall try any suit in which the matter directly and substantially in issue has been directly "
+    "and substantially in issue in a former suit between the same parties.",
+]
+
+_loaders = {}
+_models = {}
+_lock = threading.RLock()
+
+
+def register_model(name, loader):
+    """Registers a zero-argument loader; the model is only built on first `get_model(name)`."""
+    with _lock:
+        _loaders[name] = loader
+
+
+def get_model(name):
+    """
+    Returns the shared instance of a registered model, loading it on first use.
+    Every module asking for the same name gets the same object.
+    """
+    with _lock:
+        if name not in _models:
+            if name not in _loaders:
+                raise KeyError(f"Unknown model '{name}'. Registered: {sorted(_loaders)}")
+            _models[name] = _loaders[name]()
+            print(f"✅ Model '{name}' loaded ({model_memory_bytes(_models[name]) / 1e9:.2f} GB)")
+        return _models[name]
+
+
+def embedding_dimension(name):
+    """
+    Returns a registered embedding model's output dimension without loading its weights
+    when it isn't resident yet (bge-m3 pools its hidden states, so they match).
+    """
+    with _lock:
+        if name in _models:
+            return _models[name].get_sentence_embedding_dimension()
+    from transformers import AutoConfig
+    return AutoConfig.from_pretrained(MODEL_IDS[name]).hidden_size
+
+
+def model_memory_bytes(model):
+    """Approximates a model's resident size from its torch parameters and buffers."""
+    module = getattr(model, "model", model)  # Detoxify wraps its torch module
+    if not hasattr(module, "parameters"):
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def memory_usage():
+    """Returns {model name: approximate bytes} for every loaded model."""
+    with _lock:
+        return {name: model_memory_bytes(model) for name, model in _models.items()}
+
+
+def release(name):
+    """Drops a loaded model so its memory can be reclaimed; it reloads on next use."""
+    with _lock:
+        _models.pop(name, None)
+    gc.collect()
+
+
+def release_unpinned():
+    """Drops every loaded model that the deployment has not pinned in PINNED_MODELS."""
+    for name in [name for name in list(_models) if name not in PINNED_MODELS]:
+        release(name)
+
+
+def preload_pinned():
+    """Loads the pinned models up front so the first request doesn't pay for it."""
+    for name in PINNED_MODELS:
+        get_model(name)
+
+
+def embedding_cache_id(name):
+    """
+    Key of a model's vectors in the embedding cache. Quantized backends produce slightly
+    different vectors, so they are cached apart from the fp32 ones.
+    """
+    return MODEL_IDS[name] if ENCODER_BACKEND == "torch" else f"{MODEL_IDS[name]}#{ENCODER_BACKEND}"
+
+
+def parity_report_path(backend):
+    return os.path.join(PARITY_REPORT_DIR, f"{backend}.json")
+
+
+def check_parity_report(model_id, backend, threshold=ENCODER_PARITY_THRESHOLD):
+    """
+    Raises a RuntimeError unless a saved parity report shows that `backend` matched the
+    fp32 embeddings of `model_id` at `threshold` or stricter.
+    """
+    path = parity_report_path(backend)
+    report = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    if not (report.get("passed") and report.get("model") == model_id and report.get("threshold", 0.0) >= threshold):
+        raise RuntimeError(
+            f"ENCODER_BACKEND={backend} has no passing parity report for {model_id} at threshold {threshold} ({path}). "
+            f"Run `python model_registry.py --backend {backend}` first, or use ENCODER_BACKEND=torch."
+        )
+
+
+def build_sentence_transformer(model_id, backend=ENCODER_BACKEND, require_parity=True):
+    """
+    Loads a SentenceTransformer on the given inference backend. Quantized backends run on
+    CPU; the underlying `[0].auto_model` and `.tokenizer` stay usable either way.
+    A non-torch backend is refused until it has passed the parity check, unless
+    `require_parity` is False (as for the check itself).
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'. Choose from {ENCODER_BACKENDS}.")
+    if backend != "torch" and require_parity:
+        check_parity_report(model_id, backend)
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        check_onnx_support()
+        # Exported (and cached by Hugging Face) on first use, then run by ONNX Runtime
+        return SentenceTransformer(model_id, device="cpu", backend="onnx")
+
+    if backend == "torch":
+        return SentenceTransformer(model_id)
+
+    import torch
+    model = SentenceTransformer(model_id, device="cpu")
+    # Linear weights are stored as int8 and activations are quantized on the fly per batch
+    torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def check_onnx_support():
+    """
+    Raises a RuntimeError naming what to install when the ONNX backend can't run: it
+    needs sentence-transformers >= 3.2 (requirements.txt pins 2.2.2) plus optimum and
+    onnxruntime.
+    """
+    import importlib.util
+    import sentence_transformers
+
+    version = tuple(int(part) for part in re.findall(r"\d+", sentence_transformers.__version__)[:2])
+    missing = [name for name in ("optimum", "onnxruntime") if importlib.util.find_spec(name) is None]
+    if version < ONNX_MIN_SENTENCE_TRANSFORMERS or missing:
+        raise RuntimeError(
+            f"ENCODER_BACKEND=onnx needs sentence-transformers>=3.2 with optimum and onnxruntime "
+            f"(found sentence-transformers {sentence_transformers.__version__}, missing: {missing or 'none'}). "
+            f"Install them with: pip install 'sentence-transformers[onnx]>=3.2', or use ENCODER_BACKEND=int8."
+        )
+
+
+def parity_sample_texts(limit=64):
+    """Returns chunk texts from the indexed corpus for parity checks, or built-in samples."""
+    from retrieval.chunking import CHUNKED_DIR, chunk_text, iter_chunks
+    texts = []
+    for file_name in ("civil_laws_chunks.json", "criminal_laws_chunks.json"):
+        path = os.path.join(CHUNKED_DIR, file_name)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                texts += [chunk_text(chunk) for _, _, _, chunk in iter_chunks(json.load(f))][:limit // 2]
+    return PARITY_SAMPLE_TEXTS + texts
+
+
+def validate_encoder_parity(name="bge-m3", backend=ENCODER_BACKEND, texts=None, threshold=ENCODER_PARITY_THRESHOLD):
+    """
+    Compares a backend's embeddings with the fp32 model's on the same texts.
+
+    Returns:
+        dict: Minimum and mean cosine similarity to the fp32 embeddings, per-text encode
+        times of both, and whether the minimum clears `threshold`.
+    """
+    import numpy as np
+    texts = texts or parity_sample_texts()
+    models = {"torch": build_sentence_transformer(MODEL_IDS[name], "torch"), backend: build_sentence_transformer(MODEL_IDS[name], backend, require_parity=False)}
+
+    embeddings, timings = {}, {}
+    for label, model in models.items():
+        model.encode(texts[:2])  # Warm-up
+        started = time.perf_counter()
+        embeddings[label] = model.encode(texts, batch_size=16, convert_to_numpy=True, normalize_embeddings=True)
+        timings[label] = (time.perf_counter() - started) / len(texts) * 1000
+
+    similarities = np.sum(embeddings["torch"] * embeddings[backend], axis=1)
+    return {
+        "model": MODEL_IDS[name],
+        "backend": backend,
+        "texts": len(texts),
+        "min_cosine": float(similarities.min()),
+        "mean_cosine": float(similarities.mean()),
+        "fp32_ms_per_text": timings["torch"],
+        f"{backend}_ms_per_text": timings[backend],
+        "threshold": threshold,
+        "passed": bool(similarities.min() >= threshold),
+    }
+
+
+def save_parity_report(report):
+    """Saves a parity report where `build_sentence_transformer` looks for it."""
+    os.makedirs(PARITY_REPORT_DIR, exist_ok=True)
+    with open(parity_report_path(report["backend"]), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+
+def _load_sentence_transformer(model_id):
+    return build_sentence_transformer(model_id)
+
+
+def _load_cross_encoder(model_id):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_id, device="cpu", max_length=512)
+
+
+def _load_detoxify(model_type):
+    from detoxify import Detoxify
+    return Detoxify(model_type)
+
+
+register_model("bge-m3", lambda: _load_sentence_transformer(MODEL_IDS["bge-m3"]))
+register_model("reranker", lambda: _load_cross_encoder(MODEL_IDS["reranker"]))
+register_model("detoxify", lambda: _load_detoxify(MODEL_IDS["detoxify"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a quantized encoder backend against the fp32 model and record the result.")
+    parser.add_argument("--backend", choices=[b for b in ENCODER_BACKENDS if b != "torch"], default="int8", help="Backend to validate.")
+    parser.add_argument("--threshold", type=float, default=ENCODER_PARITY_THRESHOLD, help="Minimum cosine similarity to the fp32 embeddings.")
+    args = parser.parse_args()
+
+    report = validate_encoder_parity(backend=args.backend, threshold=args.threshold)
+    save_parity_report(report)
+    print(json.dumps(report, indent=4))
+    print("✅ Parity check passed" if report["passed"] else "❌ Parity check failed")
@@ -1,49 +1,229 @@
 import os
 import fitz  # PyMuPDF for PDF extraction
 import json
+import argparse
+from retrieval.manifest import load_manifest, save_manifest, hash_file, hash_text
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 # Define paths
 CIVIL_LAW_DIR = "data/civil_laws"
 CRIMINAL_LAW_DIR = "data/criminal_laws"
 OUTPUT_DIR = "data/processed"
 
+# Parallel extraction settings
+PAGES_PER_SHARD = 25  # Pages handed to a worker in one task
+
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+def extract_pages_from_pdf(pdf_path):
+    """Extracts the non-empty pages of a PDF as {page number: text}."""
+    pages = {}
+
+    with fitz.open(pdf_path) as doc:
+        for page_number, page in enumerate(doc, start=1):
+            text = page.get_text("text").strip()
+            if text:
+                pages[page_number] = text
+
+    return pages
+
 def extract_text_from_pdf(pdf_path):
     """Extracts text from a given PDF file while preserving sections."""
-    doc = fitz.open(pdf_path)
-    text_data = []
-
-    for page in doc:
-        text = page.get_text("text")
-        if text.strip():
-            text_data.append(text.strip())
+    return "\n".join(extract_pages_from_pdf(pdf_path).values())
 
-    return "\n".join(text_data)
+def load_existing_output(output_path):
+    """Loads a previous JSON extraction output, or an empty dict if there is none."""
+    if not os.path.exists(output_path):
+        return {}
+    with open(output_path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
 def process_pdfs(input_dir, output_file):
-    """Processes all PDFs in a directory and saves extracted text."""
+    """
+    Processes all PDFs in a directory and saves extracted text.
+    PDFs whose content hash matches the ingestion manifest are reused from the
+    previous output instead of being extracted again.
+    """
+    output_path = os.path.join(OUTPUT_DIR, output_file)
+    previous_data = load_existing_output(output_path)
+    manifest = load_manifest()
+    previous_pdfs = manifest["pdfs"].get(output_file, {})
+
     extracted_data = {}
+    pdf_entries = {}
 
-    for filename in os.listdir(input_dir):
+    for filename in sorted(os.listdir(input_dir)):
         if filename.endswith(".pdf"):
             pdf_path = os.path.join(input_dir, filename)
-            print(f"📖 Processing: {filename}")
+            file_hash = hash_file(pdf_path)
+            previous_entry = previous_pdfs.get(pdf_path, {})
+
+            if previous_entry.get("hash") == file_hash and filename in previous_data:
+                print(f"⏭️ Unchanged: {filename}")
+                extracted_data[filename] = previous_data[filename]
+                pdf_entries[pdf_path] = previous_entry
+                continue
 
-            extracted_text = extract_text_from_pdf(pdf_path)
-            extracted_data[filename] = extracted_text
+            print(f"📖 Processing: {filename}")
+            pages = extract_pages_from_pdf(pdf_path)
+            extracted_data[filename] = "\n".join(pages.values())
+            pdf_entries[pdf_path] = {
+                "hash": file_hash,
+                "pages": {str(page_number): hash_text(text) for page_number, text in pages.items()}
+            }
 
     # Save extracted text as JSON
-    output_path = os.path.join(OUTPUT_DIR, output_file)
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(extracted_data, f, indent=4)
 
+    manifest["pdfs"][output_file] = pdf_entries
+    save_manifest(manifest)
+
     print(f"✅ Extracted text saved to: {output_path}")
 
+
+def extract_page_range(pdf_path, start, stop):
+    """
+    Extracts pages [start, stop) of a PDF as per-page records.
+    Runs inside a worker process, so the PDF is opened independently here.
+    """
+    document = os.path.basename(pdf_path)
+    records = []
+
+    with fitz.open(pdf_path) as doc:
+        for page_number in range(start, stop):
+            text = doc[page_number].get_text("text").strip()
+            if text:
+                records.append({"document": document, "page": page_number + 1, "text": text})
+
+    return records
+
+
+def iter_page_shards(pdf_paths, pages_per_shard=PAGES_PER_SHARD):
+    """Yields (pdf_path, start, stop) page ranges covering every page of every PDF."""
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+
+        for start in range(0, page_count, pages_per_shard):
+            yield pdf_path, start, min(start + pages_per_shard, page_count)
+
+
+def extract_pdfs_parallel(pdf_paths, output_path, workers=None, pages_per_shard=PAGES_PER_SHARD, carried_records=()):
+    """
+    Extracts PDFs page-sharded across a process pool and streams the page records
+    to a JSONL file as shards finish.
+
+    At most `2 * workers` shards are in flight at any time, so memory stays bounded
+    by roughly `2 * workers * pages_per_shard` pages regardless of corpus size.
+    Records are written in completion order; sort by (document, page) when reading.
+
+    Args:
+        pdf_paths (list[str]): PDFs to extract.
+        output_path (str): JSONL file to write, one {"document", "page", "text"} record per line.
+        workers (int): Number of worker processes (defaults to the CPU count).
+        pages_per_shard (int): Pages extracted per worker task.
+        carried_records (iterable[dict]): Already-extracted page records to copy through unchanged.
+
+    Returns:
+        dict: {document: {page: text hash}} for every record written.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    page_hashes = {}
+
+    def write(records):
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            page_hashes.setdefault(record["document"], {})[str(record["page"])] = hash_text(record["text"])
+
+    def drain(futures):
+        for future in futures:
+            write(future.result())
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, "w", encoding="utf-8") as out:
+        write(carried_records)
+        pending = set()
+
+        for pdf_path, start, stop in iter_page_shards(pdf_paths, pages_per_shard):
+            pending.add(pool.submit(extract_page_range, pdf_path, start, stop))
+
+            # Apply back-pressure so finished pages are flushed before new shards are queued
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(done)
+
+        drain(wait(pending).done)
+
+    return page_hashes
+
+
+def iter_jsonl_records(path, documents):
+    """Streams the page records of `documents` from a previous JSONL extraction output."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record["document"] in documents:
+                    yield record
+
+
+def process_pdfs_parallel(input_dir, output_file, workers=None, pages_per_shard=PAGES_PER_SHARD):
+    """
+    Processes all PDFs in a directory in parallel and streams page records to JSONL.
+    Pages of PDFs whose content hash matches the ingestion manifest are copied from
+    the previous output; only new or changed PDFs are sent to the process pool.
+    """
+    pdf_paths = [os.path.join(input_dir, filename) for filename in sorted(os.listdir(input_dir)) if filename.endswith(".pdf")]
+    output_path = os.path.join(OUTPUT_DIR, output_file)
+    manifest = load_manifest()
+    previous_pdfs = manifest["pdfs"].get(output_file, {})
+
+    file_hashes = {pdf_path: hash_file(pdf_path) for pdf_path in pdf_paths}
+    unchanged = set()
+    if os.path.exists(output_path):
+        unchanged = {pdf_path for pdf_path in pdf_paths if previous_pdfs.get(pdf_path, {}).get("hash") == file_hashes[pdf_path]}
+    changed = [pdf_path for pdf_path in pdf_paths if pdf_path not in unchanged]
+    print(f"📖 Processing {len(changed)} changed PDFs ({len(unchanged)} unchanged) with {workers or os.cpu_count()} workers")
+
+    # Move the previous output aside so unchanged pages can be streamed into the new file
+    previous_path = f"{output_path}.prev"
+    carried_records = ()
+    if unchanged:
+        os.replace(output_path, previous_path)
+        carried_records = iter_jsonl_records(previous_path, {os.path.basename(pdf_path) for pdf_path in unchanged})
+
+    page_hashes = extract_pdfs_parallel(changed, output_path, workers, pages_per_shard, carried_records)
+
+    if unchanged:
+        os.remove(previous_path)
+
+    manifest["pdfs"][output_file] = {
+        pdf_path: {"hash": file_hashes[pdf_path], "pages": page_hashes.get(os.path.basename(pdf_path), {})}
+        for pdf_path in pdf_paths
+    }
+    save_manifest(manifest)
+
+    print(f"✅ Extracted {sum(len(pages) for pages in page_hashes.values())} pages saved to: {output_path}")
+
+
 if __name__ == "__main__":
-    print("🔹 Extracting Civil Law PDFs...")
-    process_pdfs(CIVIL_LAW_DIR, "civil_laws.json")
+    parser = argparse.ArgumentParser(description="Extract text from the law PDFs.")
+    parser.add_argument("--parallel", action="store_true", help="Extract page shards in a process pool and stream JSONL output.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --parallel (default: CPU count).")
+    parser.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD, help="Pages per worker task for --parallel.")
+    args = parser.parse_args()
+
+    if args.parallel:
+        print("🔹 Extracting Civil Law PDFs...")
+        process_pdfs_parallel(CIVIL_LAW_DIR, "civil_laws.jsonl", args.workers, args.pages_per_shard)
+
+        print("🔹 Extracting Criminal Law PDFs...")
+        process_pdfs_parallel(CRIMINAL_LAW_DIR, "criminal_laws.jsonl", args.workers, args.pages_per_shard)
+    else:
+        print("🔹 Extracting Civil Law PDFs...")
+        process_pdfs(CIVIL_LAW_DIR, "civil_laws.json")
 
-    print("🔹 Extracting Criminal Law PDFs...")
-    process_pdfs(CRIMINAL_LAW_DIR, "criminal_laws.json")
+        print("🔹 Extracting Criminal Law PDFs...")
+        process_pdfs(CRIMINAL_LAW_DIR, "criminal_laws.json")
@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import numpy as np
+from retrieval.chunking import CHUNKED_DIR, chunk_text, iter_chunks
+
+# Lexical index files, one per collection
+BM25_DIR = "data/bm25"
+BM25_FILES = {
+    "civil_law": os.path.join(BM25_DIR, "civil_laws.npz"),
+    "criminal_law": os.path.join(BM25_DIR, "criminal_laws.npz"),
+}
+
+# Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+# Only glue words are dropped; legal terms, numbers and "498a"-style section ids are kept
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were which with".split()
+)
+
+
+def tokenize(text):
+    """Lowercases and splits a text into word tokens, dropping stopwords."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index over the chunks of one chunk file, scored with Okapi BM25.
+
+    Postings are stored as CSR arrays (term → chunk rows and term frequencies) in a
+    compressed .npz, so the index loads without unpickling and stays a few MB.
+    """
+
+    def __init__(self, terms, indptr, postings, frequencies, doc_lengths, chunk_ids, parent_ids):
+        self.term_rows = {term: row for row, term in enumerate(terms)}
+        self.indptr = indptr
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.chunk_ids = chunk_ids
+        self.parent_ids = parent_ids
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, chunked_data):
+        """Tokenizes every chunk and builds the postings."""
+        chunk_ids, parent_ids, doc_lengths = [], [], []
+        postings_by_term = {}
+        for row, (chunk_id, _, _, chunk) in enumerate(iter_chunks(chunked_data)):
+            tokens = tokenize(chunk_text(chunk))
+            chunk_ids.append(chunk_id)
+            parent_ids.append(chunk.get("parent_id", chunk_id) if isinstance(chunk, dict) else chunk_id)
+            doc_lengths.append(len(tokens))
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings_by_term.setdefault(token, []).append((row, count))
+
+        terms = sorted(postings_by_term)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings_by_term[term]) for term in terms])
+        flat = [posting for term in terms for posting in postings_by_term[term]]
+        postings = np.array([row for row, _ in flat], dtype=np.int32)
+        frequencies = np.array([min(count, np.iinfo(np.uint16).max) for _, count in flat], dtype=np.uint16)
+
+        return cls(terms, indptr, postings, frequencies, np.array(doc_lengths, dtype=np.int32), chunk_ids, parent_ids)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        terms = sorted(self.term_rows, key=self.term_rows.get)
+        np.savez_compressed(
+            path,
+            terms=np.array(terms, dtype=str),
+            indptr=self.indptr,
+            postings=self.postings,
+            frequencies=self.frequencies,
+            doc_lengths=self.doc_lengths,
+            chunk_ids=np.array(self.chunk_ids, dtype=str),
+            parent_ids=np.array(self.parent_ids, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["terms"].tolist(), data["indptr"], data["postings"], data["frequencies"],
+                data["doc_lengths"], data["chunk_ids"].tolist(), data["parent_ids"].tolist()
+            )
+
+    def search(self, query, top_k):
+        """
+        Scores every chunk containing a query term.
+
+        Returns:
+            list[tuple[str, str, float]]: (chunk_id, parent_id, score), best first.
+        """
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+        count = len(self.chunk_ids)
+        for term in set(tokenize(query)):
+            row = self.term_rows.get(term)
+            if row is None:
+                continue
+            start, end = self.indptr[row], self.indptr[row + 1]
+            docs = self.postings[start:end]
+            tf = self.frequencies[start:end].astype(np.float32)
+            idf = np.log(1.0 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[docs] / self.average_length)
+            scores[docs] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.chunk_ids[row], self.parent_ids[row], float(scores[row])) for row in matched]
+
+
+def build_bm25_index(chunk_file, index_file):
+    """Builds the BM25 index of a chunk file and saves it next to the other indexes."""
+    with open(chunk_file, "r", encoding="utf-8") as f:
+        chunked_data = json.load(f)
+
+    index = BM25Index.build(chunked_data)
+    index.save(index_file)
+    print(f"✅ BM25 index over {len(index.chunk_ids)} chunks and {len(index.term_rows)} terms saved to: {index_file}")
+    return index
+
+
+def load_bm25_indexes():
+    """Loads the BM25 index of each law type that has one, keyed by law type."""
+    return {law_type: BM25Index.load(path) for law_type, path in BM25_FILES.items() if os.path.exists(path)}
+
+
+if __name__ == "__main__":
+    build_bm25_index(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), BM25_FILES["civil_law"])
+    build_bm25_index(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), BM25_FILES["criminal_law"])
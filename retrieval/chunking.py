@@ -1,6 +1,8 @@
 import os
 import json
 import re
+import argparse
+from retrieval.manifest import load_manifest, save_manifest, hash_text
 
 # Paths
 PROCESSED_DIR = "data/processed"
@@ -8,56 +10,347 @@ CHUNKED_DIR = "data/chunks"
 
 os.makedirs(CHUNKED_DIR, exist_ok=True)
 
-# Updated regex pattern for section headings
-SECTION_PATTERN = r"\n\d+\.\s[A-Za-z ,()'-]+?\.\u2014"
+# Token budget for sub-chunking oversized sections (counted with the embedding model's tokenizer)
+EMBEDDING_MODEL_NAME = "BAAI/bge-m3"
+MAX_CHUNK_TOKENS = 512  # Includes the encoder's special tokens
+CHUNK_OVERLAP_TOKENS = 64
+MIN_CHUNK_TOKENS = 32
+
+_tokenizer = None
+
+# Updated regex pattern for section headings (groups: section number, title)
+SECTION_PATTERN = r"\n(\d+)\.\s([A-Za-z ,()'-]+?)\." + "\u2014"
+# Structural headings scanned in the same pass: CPC-style "ORDER XXXIX" and "THE FIRST SCHEDULE"
+STRUCTURE_PATTERN = SECTION_PATTERN + r"|\nORDER\s+([IVXLC]+)\b|\n\s*THE\s+FIRST\s+SCHEDULE\b"
+SECTION_RE = re.compile(STRUCTURE_PATTERN)
+SECTION_RE_BYTES = re.compile(STRUCTURE_PATTERN.encode("utf-8"))  # For bytes / mmap sources
+
+def iter_sections(source):
+    """
+    Lazily splits legal text into section records in a single pass over the headings.
+
+    The source may be a str, or bytes / mmap.mmap holding UTF-8 text, in which case
+    offsets are byte offsets. Text before the first heading is yielded as a preamble
+    record with no section number or title.
+
+    ORDER headings don't split the text; they tag the rules that follow with their
+    order. Consecutive ORDER headings with no rule between them are an arrangement
+    table, so tagging stays off until the next FIRST SCHEDULE heading.
+
+    Args:
+        source (str | bytes | mmap.mmap): Legal text to split.
+
+    Yields:
+        dict: {"section_number", "title", "order", "start", "end"} with [start, end) offsets into the source.
+    """
+    is_text = isinstance(source, str)
+    pattern = SECTION_RE if is_text else SECTION_RE_BYTES
+    decode = (lambda value: value) if is_text else (lambda value: value.decode("utf-8"))
+
+    previous = None
+    order, in_table, last_was_order = None, False, False
+    for match in pattern.finditer(source):
+        if match.group(1) is None:
+            if match.group(3) is None:  # FIRST SCHEDULE heading
+                order, in_table = None, False
+            else:
+                in_table = in_table or last_was_order
+                order = decode(match.group(3))
+            last_was_order = match.group(3) is not None
+            continue
+
+        last_was_order = False
+        start = match.start() + 1  # Skip the newline that anchors the heading
+
+        if previous is None:
+            if source[:match.start()].strip():
+                yield {"section_number": None, "title": None, "order": None, "start": 0, "end": match.start()}
+        else:
+            yield dict(previous, end=match.start())
+
+        previous = {
+            "section_number": decode(match.group(1)),
+            "title": decode(match.group(2)).strip(),
+            "order": None if in_table else order,
+            "start": start,
+        }
+
+    if previous is not None:
+        yield dict(previous, end=len(source))
+    elif source[:].strip():
+        yield {"section_number": None, "title": None, "order": None, "start": 0, "end": len(source)}
+
+
+def section_text(source, record):
+    """Returns the stripped text of a section record from its source."""
+    text = source[record["start"]:record["end"]]
+    return (text if isinstance(text, str) else bytes(text).decode("utf-8")).strip()
+
 
 def split_text_by_sections(text):
-    """Splits legal text into chunks based on section titles."""
-    sections = re.split(SECTION_PATTERN, text)  # Split at detected section headings
-    print("Number of sections:", len(sections))
+    """Splits legal text into chunk records based on section titles."""
+    chunks = [dict(record, text=section_text(text, record)) for record in iter_sections(text)]
+    print("Number of sections:", len(chunks))
+    return chunks
 
-    section_titles = re.findall(SECTION_PATTERN, text)
-    print("Number of titles:", len(section_titles))
 
-    # # Print extracted section titles
-    # print("Section Titles:")
-    # for title in section_titles:
-    #     print(title.strip())
+def chunk_text(chunk):
+    """Returns the text of a chunk entry, which is a plain string in older chunk files."""
+    return chunk if isinstance(chunk, str) else chunk["text"]
 
-    chunks = []
-    for i, section in enumerate(sections):
-        if i < len(section_titles):
-            cleaned_title = section_titles[i].strip()
-            chunk = f"{cleaned_title}\n{section.strip()}"
-            chunks.append(chunk)
+
+def get_tokenizer():
+    """Loads the embedding model's tokenizer on first use."""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    return _tokenizer
+
+
+def validate_window_settings(max_tokens, overlap, tokenizer=None):
+    """
+    Checks that windows of `max_tokens` tokens can advance with `overlap` shared tokens,
+    i.e. 0 <= overlap < max_tokens minus the encoder's special tokens.
+
+    Raises:
+        ValueError: If they cannot, since every long section would otherwise be dropped.
+    """
+    budget = max_tokens - (tokenizer or get_tokenizer()).num_special_tokens_to_add()
+    if budget <= 0:
+        raise ValueError(f"max_tokens ({max_tokens}) leaves no room for text after the special tokens.")
+    if not 0 <= overlap < budget:
+        raise ValueError(f"overlap ({overlap}) must be at least 0 and below the text budget of {budget} tokens.")
+
+
+def token_windows(text, tokenizer, max_tokens, overlap):
+    """
+    Splits text into overlapping windows of at most `max_tokens` tokens.
+
+    Returns:
+        list[tuple[int, int]]: [start, end) character spans of the windows within `text`.
+    """
+    validate_window_settings(max_tokens, overlap, tokenizer)
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= budget:
+        return [(0, len(text))]
+
+    spans = []
+    step = budget - overlap
+    for first in range(0, len(offsets), step):
+        last = min(first + budget, len(offsets)) - 1
+        spans.append((offsets[first][0], offsets[last][1]))
+        if last == len(offsets) - 1:
+            break
+    return spans
+
+
+def merge_small_sections(records, token_counts, min_tokens, max_tokens):
+    """
+    Merges fragments shorter than `min_tokens` into a neighbouring section, as long as
+    the merged text stays within `max_tokens`.
+    """
+    merged = []
+    for record, count in zip(records, token_counts):
+        if merged and (count < min_tokens or merged[-1]["tokens"] < min_tokens) and merged[-1]["tokens"] + count <= max_tokens:
+            previous = merged[-1]
+            previous["text"] = f"{previous['text']}\n{record['text']}"
+            previous["end"] = record["end"]
+            previous["tokens"] += count
+            if previous["section_number"] is None:
+                previous.update(section_number=record["section_number"], title=record["title"])
         else:
-            chunks.append(section.strip())
+            merged.append(dict(record, tokens=count))
+    return merged
+
+
+def split_by_token_budget(doc_name, records, max_tokens=MAX_CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS, min_tokens=MIN_CHUNK_TOKENS, tokenizer=None):
+    """
+    Re-chunks section records so each chunk fits the embedding model's input.
+
+    Tiny fragments are merged into a neighbour first. Every resulting section is a
+    parent: if it fits the budget it is emitted as one chunk, otherwise as overlapping
+    windows that share its `parent_id` and carry their character span within it.
 
+    Args:
+        doc_name (str): Document the records belong to, used to build chunk ids.
+        records (list[dict]): Section records with text, as produced by `split_text_by_sections`.
+        max_tokens (int): Token budget per chunk, including special tokens.
+        overlap (int): Tokens shared by consecutive windows of a section.
+        min_tokens (int): Sections shorter than this are merged into a neighbour.
+        tokenizer: Tokenizer to count with (defaults to the embedding model's).
+
+    Returns:
+        list[dict]: Chunk records with "id", "parent_id", "window", "window_count",
+        "window_start" and "window_end" added.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    token_counts = [len(tokenizer(record["text"], add_special_tokens=False)["input_ids"]) for record in records]
+    sections = merge_small_sections(records, token_counts, min_tokens, max_tokens)
+
+    chunks = []
+    for p, section in enumerate(sections):
+        parent_id = f"{doc_name}_{p}"
+        text = section.pop("text")
+        section.pop("tokens")
+        spans = token_windows(text, tokenizer, max_tokens, overlap)
+
+        for w, (start, end) in enumerate(spans):
+            chunks.append(dict(
+                section,
+                id=parent_id if len(spans) == 1 else f"{parent_id}_w{w}",
+                parent_id=parent_id,
+                window=w,
+                window_count=len(spans),
+                window_start=start,
+                window_end=end,
+                text=text[start:end],
+            ))
+
+    print(f"Number of chunks after token budgeting: {len(chunks)} ({len(sections)} sections)")
     return chunks
 
 
-def process_json(file_path, output_file):
-    """Loads extracted text JSON, chunks it by sections"""
+def join_windows(windows):
+    """
+    Joins the windows of one section in text order, dropping the overlap between
+    consecutive windows and marking gaps between non-adjacent ones with "...".
+
+    Args:
+        windows (list[dict]): Window records or metadata with "text", "window_start" and "window_end".
+    """
+    text, covered = "", None
+    for window in sorted(windows, key=lambda w: w["window_start"]):
+        if covered is None:
+            text = window["text"]
+        elif window["window_start"] > covered:
+            text += "\n...\n" + window["text"]
+        elif window["window_end"] > covered:
+            text += window["text"][covered - window["window_start"]:]
+        else:
+            continue
+        covered = window["window_end"]
+    return text
+
+
+def iter_chunks(chunked_data):
+    """Yields (chunk_id, doc_name, chunk_index, chunk) for every chunk, using the vector store ids."""
+    for doc_name, chunks in chunked_data.items():
+        for i, chunk in enumerate(chunks):
+            chunk_id = chunk["id"] if isinstance(chunk, dict) and "id" in chunk else f"{doc_name}_{i}"
+            yield chunk_id, doc_name, i, chunk
+
+
+def load_extracted_text(file_path):
+    """
+    Loads extracted text as {document: text}.
+    Accepts the JSON output of `process_pdfs` or the per-page JSONL output of
+    `process_pdfs_parallel`, whose pages are reassembled in page order.
+    """
+    if not file_path.endswith(".jsonl"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    pages = {}
     with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                pages.setdefault(record["document"], []).append((record["page"], record["text"]))
+
+    return {doc_name: "\n".join(text for _, text in sorted(doc_pages)) for doc_name, doc_pages in pages.items()}
+
+
+def chunk_hashes(chunked_data):
+    """Returns {chunk_id: text hash} for chunked data, using the same ids as the vector store."""
+    return {chunk_id: hash_text(chunk_text(chunk)) for chunk_id, _, _, chunk in iter_chunks(chunked_data)}
+
+
+def process_json(file_path, output_file, max_tokens=None, overlap=CHUNK_OVERLAP_TOKENS, min_tokens=MIN_CHUNK_TOKENS):
+    """
+    Loads extracted text JSON, chunks it by sections.
+    Documents whose text hash matches the ingestion manifest keep their previous chunks.
+    With `max_tokens`, sections are further split to the embedding model's token budget.
+    """
+    if max_tokens:
+        validate_window_settings(max_tokens, overlap)
+
+    data = load_extracted_text(file_path)
+    output_path = os.path.join(CHUNKED_DIR, output_file)
+
+    previous_chunks = {}
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            previous_chunks = json.load(f)
+
+    manifest = load_manifest()
+    previous_documents = manifest["documents"].get(output_file, {})
 
     chunked_data = {}
+    document_hashes = {}
+
+    # Chunking settings are part of the hash so changing them re-chunks every document
+    settings = json.dumps({"max_tokens": max_tokens, "overlap": overlap, "min_tokens": min_tokens}) if max_tokens else ""
 
     for doc_name, text in data.items():
+        document_hashes[doc_name] = hash_text(settings + text)
+
+        if previous_documents.get(doc_name) == document_hashes[doc_name] and doc_name in previous_chunks:
+            print(f"⏭️ Unchanged: {doc_name}")
+            chunked_data[doc_name] = previous_chunks[doc_name]
+            continue
+
         print(f"🔹 Splitting {doc_name} into sections...")
         sections = split_text_by_sections(text)
+        if max_tokens:
+            sections = split_by_token_budget(doc_name, sections, max_tokens, overlap, min_tokens)
         chunked_data[doc_name] = sections
 
     # Save chunked data
-    output_path = os.path.join(CHUNKED_DIR, output_file)
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(chunked_data, f, indent=4)
 
+    manifest["documents"][output_file] = document_hashes
+    manifest["chunks"][output_file] = chunk_hashes(chunked_data)
+    save_manifest(manifest)
+
     print(f"✅ Chunked data saved to: {output_path}")
 
+def extracted_path(name):
+    """Returns the most recently written extraction output (JSONL or JSON) for `name`."""
+    candidates = [os.path.join(PROCESSED_DIR, f"{name}{ext}") for ext in (".jsonl", ".json")]
+    existing = [path for path in candidates if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else candidates[-1]
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk extracted law texts by section.")
+    parser.add_argument("--max-tokens", type=int, default=MAX_CHUNK_TOKENS, help="Token budget per chunk (0 keeps whole sections).")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS, help="Tokens shared by consecutive windows of a long section.")
+    parser.add_argument("--min-tokens", type=int, default=MIN_CHUNK_TOKENS, help="Sections shorter than this are merged into a neighbour.")
+    parser.add_argument("--no-dedup", action="store_true", help="Skip removing duplicate sections after chunking.")
+    args = parser.parse_args()
+    if args.max_tokens:
+        try:
+            validate_window_settings(args.max_tokens, args.overlap)
+        except ValueError as e:
+            parser.error(str(e))
+
     print("🔹 Processing Civil Law data...")
-    process_json(os.path.join(PROCESSED_DIR, "civil_laws.json"), "civil_laws_chunks.json")
+    process_json(extracted_path("civil_laws"), "civil_laws_chunks.json", args.max_tokens, args.overlap, args.min_tokens)
 
     print("🔹 Processing Criminal Law data...")
-    process_json(os.path.join(PROCESSED_DIR, "criminal_laws.json"), "criminal_laws_chunks.json")
+    process_json(extracted_path("criminal_laws"), "criminal_laws_chunks.json", args.max_tokens, args.overlap, args.min_tokens)
+
+    if not args.no_dedup:
+        from retrieval.dedup import dedup_chunks
+        dedup_chunks(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"))
+        dedup_chunks(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"))
+
+    from retrieval.section_index import build_section_index, SECTION_INDEX_FILES
+    build_section_index(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), SECTION_INDEX_FILES["civil_law"])
+    build_section_index(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), SECTION_INDEX_FILES["criminal_law"])
+
+    from retrieval.bm25 import build_bm25_index, BM25_FILES
+    build_bm25_index(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), BM25_FILES["civil_law"])
+    build_bm25_index(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), BM25_FILES["criminal_law"])
@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import zlib
+import argparse
+import numpy as np
+from retrieval.chunking import CHUNKED_DIR, chunk_text, chunk_hashes, iter_chunks
+from retrieval.manifest import load_manifest, save_manifest, hash_text
+
+# MinHash / LSH settings for near-duplicate detection
+SHINGLE_SIZE = 5  # Words per shingle
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 bands x 8 rows: candidate pairs from roughly 0.7 Jaccard upwards
+NEAR_DUPLICATE_THRESHOLD = 0.85  # Estimated Jaccard similarity needed to collapse a candidate
+MERSENNE_PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(42)
+_PERM_A = _rng.integers(1, MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_text(text):
+    """Lowercases and collapses whitespace so formatting differences don't hide duplicates."""
+    return " ".join(text.lower().split())
+
+
+def shingle_hashes(text):
+    """Returns the distinct 32-bit hashes of the word shingles of a text."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) % MERSENNE_PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signature(text):
+    """Computes the MinHash signature of a text, or None if it is too short to shingle."""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+def group_sections(chunked_data):
+    """
+    Groups chunks into sections so the windows of one section are kept or dropped together.
+
+    Returns:
+        dict: {parent_id: {"ids": [chunk ids], "text": section text}} in file order.
+    """
+    sections = {}
+    for chunk_id, _, _, chunk in iter_chunks(chunked_data):
+        parent_id = chunk.get("parent_id", chunk_id) if isinstance(chunk, dict) else chunk_id
+        section = sections.setdefault(parent_id, {"ids": [], "texts": []})
+        section["ids"].append(chunk_id)
+        section["texts"].append(chunk_text(chunk))
+
+    return {parent_id: {"ids": s["ids"], "text": "\n".join(s["texts"])} for parent_id, s in sections.items()}
+
+
+def find_duplicates(sections, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Finds exact and near-duplicate sections. The first occurrence is kept and later
+    copies are collapsed into it.
+
+    Args:
+        sections (dict): {section_id: {"text": ...}} in priority order.
+        threshold (float): Estimated Jaccard similarity above which sections are near-duplicates.
+
+    Returns:
+        list[dict]: {"removed", "kept", "kind", "similarity"} for every collapsed section.
+    """
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    exact_index = {}
+    buckets = {}
+    signatures = {}
+    duplicates = []
+
+    for section_id, section in sections.items():
+        digest = hash_text(normalize_text(section["text"]))
+        if digest in exact_index:
+            duplicates.append({"removed": section_id, "kept": exact_index[digest], "kind": "exact", "similarity": 1.0})
+            continue
+
+        signature = minhash_signature(section["text"])
+        if signature is None:
+            exact_index[digest] = section_id
+            continue
+
+        band_keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+        candidates = {kept_id for key in band_keys for kept_id in buckets.get(key, ())}
+
+        best_id, best_similarity = None, 0.0
+        for kept_id in candidates:
+            similarity = float(np.mean(signatures[kept_id] == signature))
+            if similarity > best_similarity:
+                best_id, best_similarity = kept_id, similarity
+
+        if best_similarity >= threshold:
+            duplicates.append({"removed": section_id, "kept": best_id, "kind": "near", "similarity": round(best_similarity, 3)})
+            continue
+
+        # Only kept sections are indexed, so removed copies never become collapse targets
+        exact_index[digest] = section_id
+        signatures[section_id] = signature
+        for key in band_keys:
+            buckets.setdefault(key, []).append(section_id)
+
+    return duplicates
+
+
+def dedup_chunks(file_path, report_path=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Removes exact and near-duplicate sections from a chunk file in place and writes
+    a report of what was collapsed into what.
+
+    Args:
+        file_path (str): Chunk JSON produced by `process_json`.
+        report_path (str): Where to write the report (defaults to `<chunk file>_dedup_report.json`).
+        threshold (float): Estimated Jaccard similarity for near-duplicates.
+
+    Returns:
+        dict: The dedup report.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        chunked_data = json.load(f)
+
+    sections = group_sections(chunked_data)
+    duplicates = find_duplicates(sections, threshold)
+    removed_ids = {chunk_id for duplicate in duplicates for chunk_id in sections[duplicate["removed"]]["ids"]}
+
+    # Chunks keep their original ids explicitly, so removing one never renumbers the rest
+    deduped_data = {
+        doc_name: [
+            dict(chunk, id=chunk_id) if isinstance(chunk, dict) else {"id": chunk_id, "text": chunk}
+            for chunk_id, _, _, chunk in iter_chunks({doc_name: chunks})
+            if chunk_id not in removed_ids
+        ]
+        for doc_name, chunks in chunked_data.items()
+    }
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(deduped_data, f, indent=4)
+
+    # Keep the manifest's chunk hashes in step with the rewritten file
+    output_file = os.path.basename(file_path)
+    manifest = load_manifest()
+    manifest["chunks"][output_file] = chunk_hashes(deduped_data)
+    save_manifest(manifest)
+
+    for duplicate in duplicates:
+        duplicate["preview"] = sections[duplicate["removed"]]["text"][:120]
+
+    report = {
+        "chunk_file": file_path,
+        "sections": len(sections),
+        "exact_duplicates": sum(d["kind"] == "exact" for d in duplicates),
+        "near_duplicates": sum(d["kind"] == "near" for d in duplicates),
+        "chunks_removed": len(removed_ids),
+        "collapsed": duplicates,
+    }
+
+    report_path = report_path or file_path.replace(".json", "_dedup_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"✅ Removed {report['exact_duplicates']} exact and {report['near_duplicates']} near-duplicate sections "
+          f"({len(removed_ids)} chunks) from {file_path}; report saved to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove duplicate sections from the chunk files before embedding.")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD, help="Estimated Jaccard similarity for near-duplicates.")
+    args = parser.parse_args()
+
+    print("🔹 Deduplicating Civil Law chunks...")
+    dedup_chunks(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), threshold=args.threshold)
+
+    print("🔹 Deduplicating Criminal Law chunks...")
+    dedup_chunks(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), threshold=args.threshold)
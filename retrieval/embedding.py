@@ -1,77 +1,170 @@
 import os
 import json
-import torch
-import shutil
-from sentence_transformers import SentenceTransformer, models
-import chromadb  # Using ChromaDB for storing embeddings
-
-# Delete the entire ChromaDB directory (Wipe all stored data)
-shutil.rmtree("data/vector_db")
-print("vector db removed")
+import time
+import argparse
+import numpy as np
+from retrieval.chunking import chunk_hashes, chunk_text, iter_chunks
+from retrieval.manifest import load_manifest, save_manifest, diff_hashes
+from retrieval.sharded_embedding import embed_texts_sharded, SHARD_OUTPUT_DIR
+from retrieval.embedding_cache import get_embedding_cache
+from retrieval.vector_store import get_vector_store
+from retrieval.text_store import write_text_store
+from model_registry import ENCODER_BACKEND, MODEL_IDS, embedding_cache_id, embedding_dimension, get_model
 
 # Paths
 CHUNKED_DIR = "data/chunks"
-VECTOR_DB_DIR = "data/vector_db"
-
-os.makedirs(VECTOR_DB_DIR, exist_ok=True)
-
-# Force SentenceTransformer to use Legal-BERT with pooling
-word_embedding_model = models.Transformer("nlpaueb/legal-bert-base-uncased", max_seq_length=512)
-pooling_model = models.Pooling(word_embedding_model.get_word_embedding_dimension(), pooling_mode_mean_tokens=True)
 
-# Combine Transformer + Pooling into SentenceTransformer
-# embedding_model = SentenceTransformer(modules=[word_embedding_model, pooling_model])
-# Load BGE-M3 (Optimized for retrieval)
-embedding_model = SentenceTransformer("BAAI/bge-m3")
+EMBEDDING_MODEL_NAME = MODEL_IDS["bge-m3"]
+EMBED_BATCH_SIZE = 32  # Chunks encoded and written to the vector store per batch
 
-print("✅ BAAI/bge-m3 Model for Chunk Embeddings Loaded with Custom Pooling!")
+# Chunk record fields copied into vector store metadata (window fields link sub-chunks to their section)
+CHUNK_METADATA_KEYS = ("section_number", "title", "parent_id", "window", "window_count", "window_start", "window_end")
 
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(path=VECTOR_DB_DIR)
+def get_collections():
+    """
+    Returns the separate collections for Civil & Criminal Laws, each on its configured
+    backend (ChromaDB by default).
 
-# Delete corrupted embeddings
-# print("Deleting collections")
-# chroma_client.delete_collection("civil_law_rag")
-# print("Deleted collection civil")
-# chroma_client.delete_collection("criminal_law_rag")
-# print("Deleted collection criminal")
-
-# Separate collections for Civil & Criminal Laws
-civil_law_collection = chroma_client.get_or_create_collection(name="civil_law_rag", metadata={"hnsw:space": "cosine", "index_type": "IVF_FLAT"})
-criminal_law_collection = chroma_client.get_or_create_collection(name="criminal_law_rag", metadata={"hnsw:space": "cosine", "index_type": "IVF_FLAT"})
+    Opened on demand rather than at import: spawned embedding workers re-import this
+    module as `__mp_main__`, and must not each open a ChromaDB client or load a matrix.
+    """
+    return get_vector_store("civil_law_rag"), get_vector_store("criminal_law_rag")
 
 def load_chunked_data(file_path):
     """Loads chunked data from JSON."""
     with open(file_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def embed_and_store(file_path, collection):
-    """Embeds legal text chunks and stores them in the appropriate vector database collection."""
+def get_chunk_cache():
+    """Returns the content-addressed cache shared with query embedding at retrieval time."""
+    return get_embedding_cache(embedding_cache_id("bge-m3"), embedding_dimension("bge-m3"))
+
+def encode_sharded(texts, name, batch_size, workers, threads_per_worker):
+    """Encodes texts across worker processes and returns the vectors as an in-memory array."""
+    output_path = os.path.join(SHARD_OUTPUT_DIR, f"{name}.f32")
+    vectors = embed_texts_sharded(texts, EMBEDDING_MODEL_NAME, embedding_dimension("bge-m3"), workers, threads_per_worker, batch_size, output_path=output_path, backend=ENCODER_BACKEND)
+    vectors = np.array(vectors)
+    os.remove(output_path)
+    return vectors
+
+def embed_and_store(file_path, collection, batch_size=EMBED_BATCH_SIZE, workers=1, threads_per_worker=None):
+    """
+    Embeds legal text chunks and stores them in the appropriate vector database collection.
+    Only chunks whose text hash differs from the ingestion manifest are embedded and
+    upserted; chunk ids that no longer exist are deleted from the collection.
+    Chunks are encoded in length-sorted batches and each batch is written with one upsert.
+    With `workers` > 1 the encoding is sharded across that many CPU processes.
+    Vectors already in the embedding cache are reused instead of being encoded again.
+    The in-process model is only loaded when something has to be encoded without workers.
+    Chunk texts go to the collection's text store; the vector store only keeps ids and
+    small metadata.
+    """
     data = load_chunked_data(file_path)
+    chunk_cache = get_chunk_cache()
+    manifest = load_manifest()
+
+    # Rewritten whole on every run (it is a few MB), before any new vector can be returned
+    write_text_store(collection.name, ((chunk_id, chunk_text(chunk)) for chunk_id, _, _, chunk in iter_chunks(data)))
+
+    # An empty collection means the vector DB was wiped, so nothing recorded is actually stored
+    embedded = manifest["embedded"].get(collection.manifest_key, {}) if collection.count() else {}
+    current = chunk_hashes(data)
+    changed, removed = diff_hashes(embedded, current)
+    changed = set(changed)
+
+    # A populated collection the manifest knows nothing about (e.g. built before the manifest
+    # existed) is diffed against the ids it actually holds, so stale chunks get deleted too
+    if collection.manifest_key not in manifest["embedded"] and collection.count():
+        removed = [chunk_id for chunk_id in collection.get(include=()).get("ids", []) if chunk_id not in current]
+    print(f"🔹 {len(changed)} new/changed chunks, {len(removed)} removed, {len(current) - len(changed)} unchanged")
+
+    if removed:
+        collection.delete(ids=removed)
+
+    pending = []
+    for chunk_id, doc_name, i, chunk in iter_chunks(data):
+        if chunk_id not in changed:
+            continue
+
+        text = chunk_text(chunk)
+        metadata = {"document": doc_name, "chunk_index": i}
+        if isinstance(chunk, dict):
+            metadata.update({key: chunk[key] for key in CHUNK_METADATA_KEYS if chunk.get(key) is not None})
+        pending.append((chunk_id, text, metadata))
+
+    # Sorting by length keeps similar-sized chunks in one batch, so little compute goes to padding
+    pending.sort(key=lambda item: len(item[1]), reverse=True)
+    started = time.perf_counter()
+
+    # With several workers every uncached vector is computed up front across processes, then written in batches
+    sharded_embeddings = None
+    if workers > 1 and pending:
+        sharded_embeddings = chunk_cache.encode(
+            [text for _, text, _ in pending],
+            lambda missing: encode_sharded(missing, collection.name, batch_size, workers, threads_per_worker)
+        )
+
+    for first in range(0, len(pending), batch_size):
+        batch = pending[first:first + batch_size]
+        if sharded_embeddings is not None:
+            embeddings = sharded_embeddings[first:first + len(batch)]
+        else:
+            embeddings = chunk_cache.encode(
+                [text for _, text, _ in batch],
+                lambda missing: get_model("bge-m3").encode(missing, batch_size=batch_size, convert_to_numpy=True)
+            )
 
-    for doc_name, chunks in data.items():
-        print(f"🔹 Processing {doc_name}...")
+        collection.upsert(
+            ids=[chunk_id for chunk_id, _, _ in batch],
+            embeddings=embeddings,
+            metadatas=[metadata for _, _, metadata in batch]
+        )
+        for chunk_id, _, _ in batch:
+            embedded[chunk_id] = current[chunk_id]
 
-        for i, chunk in enumerate(chunks):
-            embedding = embedding_model.encode(chunk, convert_to_tensor=True).cpu().tolist()
-            collection.add(
-                ids=[f"{doc_name}_{i}"],
-                embeddings=[embedding],
-                metadatas=[{"document": doc_name, "chunk_index": i, "text": chunk}]
-            )
-            if i < 3:  # Print first 3 embeddings
-                print(f"✅ Chunk {i} Embedding (First 10 Values):", embedding[:10])
+        done = first + len(batch)
+        print(f"✅ Stored {done}/{len(pending)} chunks ({done / (time.perf_counter() - started):.1f} chunks/sec)")
+
+    collection.flush()
+    chunk_cache.flush()
+    print(f"🔹 Embedding cache: {chunk_cache.stats()}")
+
+    for chunk_id in removed:
+        embedded.pop(chunk_id, None)
+    manifest["embedded"][collection.manifest_key] = embedded
+    save_manifest(manifest)
 
     print(f"✅ Embeddings stored for {file_path}")
 
 
+def reset_collections():
+    """Empties both collections and clears their manifest entries for a full rebuild."""
+    manifest = load_manifest()
+    for collection in get_collections():
+        collection.reset()
+        manifest["embedded"].pop(collection.manifest_key, None)
+    save_manifest(manifest)
+    print("vector db collections removed")
+
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed chunked law texts into the vector stores.")
+    parser.add_argument("--rebuild", action="store_true", help="Drop both collections and re-embed every chunk.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks encoded and written per batch.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes to shard embedding across (CPU index builds).")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Torch intra-op threads per worker (default: cores / workers).")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        reset_collections()
+
+    civil_law_collection, criminal_law_collection = get_collections()
 
     print("🔹 Embedding Civil Law data...")
-    embed_and_store(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), civil_law_collection)
+    embed_and_store(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), civil_law_collection, args.batch_size, args.workers, args.threads_per_worker)
 
     print("🔹 Embedding Criminal Law data...")
-    embed_and_store(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), criminal_law_collection)
+    embed_and_store(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), criminal_law_collection, args.batch_size, args.workers, args.threads_per_worker)
 
     print("✅ All embeddings stored successfully in separate collections!")
@@ -0,0 +1,273 @@
+import os
+import re
+import json
+import atexit
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from retrieval.manifest import hash_text
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, but rows are still verified by their key tags
+    fcntl = None
+
+# Persistent embedding cache shared by index builds, retrieval and the relevancy agent
+EMBEDDING_CACHE_DIR = "data/embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000  # Per model; least recently used vectors are evicted beyond this
+FLUSH_EVERY = 256  # New vectors written before the offset index is persisted again
+INDEX_FORMAT = 2  # Bumped when the on-disk layout changes; older caches are discarded
+TAG_BYTES = 32  # SHA-256 of the key stored next to each row
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def key_tag(key):
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache for one model, stored as a memory-mapped float32
+    matrix plus an offset index of {text hash: row} kept in least-recently-used order.
+
+    Several processes may share a cache (the app and an index build, say). Writes take an
+    exclusive file lock and first merge the index other processes have persisted; reads
+    take a shared one. Every row also carries a tag of the key it was written for, and a
+    read whose tag doesn't match is a miss, so an index that is stale (another process
+    reused the row, or a crash came before the index was persisted) can never return
+    another text's vector. The index is persisted every FLUSH_EVERY insertions and at
+    interpreter exit.
+    """
+
+    def __init__(self, model_id, dim, cache_dir=EMBEDDING_CACHE_DIR, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model_id = model_id
+        self.dim = dim
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.tags_path = os.path.join(self.directory, "tags.bin")
+        self.index_path = os.path.join(self.directory, "index.json")
+
+        self.lock = threading.RLock()
+        self.rows = OrderedDict()  # Text hash → row, least recently used first
+        self.free_rows = []
+        self.capacity = 0
+        self.vectors = None
+        self.tags = None
+        self.index_version = None  # Modification time of the index file last merged
+        self.pending_writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock_file = open(os.path.join(self.directory, "lock"), "a+")
+        with self.lock, self._file_lock(exclusive=True):
+            self._load()
+        atexit.register(self.flush)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """Inter-process lock on the cache directory (callers hold `self.lock` too)."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        """Returns the persisted index if it belongs to this model shape and layout, else None."""
+        if not os.path.exists(self.index_path):
+            return None
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format") != INDEX_FORMAT or index["model_id"] != self.model_id or index["dim"] != self.dim:
+            return None
+        return index
+
+    def _file_capacity(self):
+        """Rows present in both backing files."""
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.tags_path)):
+            return 0
+        return min(os.path.getsize(self.vectors_path) // (self.dim * 4), os.path.getsize(self.tags_path) // TAG_BYTES)
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.tags = np.memmap(self.tags_path, dtype=np.uint8, mode="r+", shape=(capacity, TAG_BYTES))
+
+    def _tag_matches(self, row, key):
+        return row < self.capacity and bytes(self.tags[row]) == key_tag(key)
+
+    def _load(self):
+        """
+        Opens the persisted matrix and index, discarding them if they belong to another
+        model shape or layout. Files without an index yet (another process hasn't
+        persisted it) are kept and mapped with no known rows.
+        """
+        index = self._read_index()
+        if (index is None and os.path.exists(self.index_path)) or not os.path.exists(self.tags_path):
+            for path in (self.vectors_path, self.tags_path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        if self._file_capacity():
+            self._map(self._file_capacity())
+        if index is not None:
+            self.rows = OrderedDict((key, row) for key, row in index["rows"] if self._tag_matches(row, key))
+            self.index_version = os.stat(self.index_path).st_mtime_ns
+        self._reset_free_rows()
+
+    def _reset_free_rows(self):
+        used = set(self.rows.values())
+        self.free_rows = [row for row in reversed(range(self.capacity)) if row not in used]
+
+    def _sync(self):
+        """
+        Picks up what other processes wrote since this one last looked: a grown matrix
+        and a newer index, merged with this process's unpersisted entries. A row claimed
+        by two keys goes to the one whose tag it carries. Call under the exclusive lock.
+        """
+        file_capacity = self._file_capacity()
+        if file_capacity > self.capacity:
+            self._map(file_capacity)
+            self._reset_free_rows()
+
+        version = os.stat(self.index_path).st_mtime_ns if os.path.exists(self.index_path) else None
+        if version is None or version == self.index_version:
+            return
+        index = self._read_index()
+        if index is not None:
+            merged = OrderedDict(index["rows"])
+            for key, row in self.rows.items():
+                merged.pop(key, None)
+                merged[key] = row
+            self.rows = OrderedDict((key, row) for key, row in merged.items() if self._tag_matches(row, key))
+            self._reset_free_rows()
+        self.index_version = version
+
+    def _grow(self):
+        """Doubles the backing files, up to the size cap."""
+        new_capacity = min(self.max_entries, max(1024, 2 * self.capacity))
+        if new_capacity <= self.capacity:
+            return
+
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.tags.flush()
+        for path, row_bytes in ((self.vectors_path, self.dim * 4), (self.tags_path, TAG_BYTES)):
+            with open(path, "ab") as f:
+                if f.tell() < new_capacity * row_bytes:
+                    f.truncate(new_capacity * row_bytes)
+
+        self.free_rows = list(reversed(range(self.capacity, new_capacity))) + self.free_rows
+        self._map(new_capacity)
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys that are cached, marking them as recently used."""
+        with self.lock, self._file_lock(exclusive=False):
+            found = {}
+            for key in keys:
+                row = self.rows.get(key)
+                if row is None:
+                    continue
+                if not self._tag_matches(row, key):
+                    # The row was reused for another key, by another process or before a crash
+                    del self.rows[key]
+                    continue
+                self.rows.move_to_end(key)
+                found[key] = np.array(self.vectors[row])
+            return found
+
+    def put_many(self, keys, vectors):
+        """Stores vectors under their keys, evicting the least recently used rows at the size cap."""
+        with self.lock, self._file_lock(exclusive=True):
+            self._sync()
+            for key, vector in zip(keys, vectors):
+                row = self.rows.get(key)
+                if row is None:
+                    if not self.free_rows:
+                        self._grow()
+                    if self.free_rows:
+                        row = self.free_rows.pop()
+                    else:
+                        _, row = self.rows.popitem(last=False)
+                    self.rows[key] = row
+                else:
+                    self.rows.move_to_end(key)
+                self.vectors[row] = vector
+                self.tags[row] = np.frombuffer(key_tag(key), dtype=np.uint8)
+
+            self.pending_writes += len(keys)
+            if self.pending_writes >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        if self.vectors is None or not self.pending_writes:
+            return
+
+        self.vectors.flush()
+        self.tags.flush()
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT, "model_id": self.model_id, "dim": self.dim, "capacity": self.capacity, "rows": list(self.rows.items())}, f)
+        os.replace(tmp_path, self.index_path)
+        self.index_version = os.stat(self.index_path).st_mtime_ns
+        self.pending_writes = 0
+
+    def flush(self):
+        """Persists the vectors and the offset index, merged with what other processes persisted."""
+        with self.lock, self._file_lock(exclusive=True):
+            if self.pending_writes:
+                self._sync()
+            self._flush()
+
+    def encode(self, texts, encode_fn):
+        """
+        Returns embeddings for texts, computing only the ones that are not cached.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            encode_fn (callable): Encodes a list of distinct texts into an (n, dim) array.
+
+        Returns:
+            np.ndarray: (len(texts), dim) float32 embeddings in input order.
+        """
+        keys = [hash_text(text) for text in texts]
+        found = self.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self.put_many(list(missing), vectors)
+            found.update(zip(missing, vectors))
+
+        with self.lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        return np.stack([found[key] for key in keys]) if keys else np.zeros((0, self.dim), dtype=np.float32)
+
+    def stats(self):
+        """Returns entry count and hit/miss counters."""
+        with self.lock:
+            return {"model_id": self.model_id, "entries": len(self.rows), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+def get_embedding_cache(model_id, dim):
+    """Returns the process-wide cache for a model id, so all modules share one index and matrix."""
+    with _caches_lock:
+        if model_id not in _caches:
+            _caches[model_id] = EmbeddingCache(model_id, dim)
+        return _caches[model_id]
@@ -1,20 +1,14 @@
-import chromadb
+from retrieval.vector_store import get_vector_store
 
 
 def get_chroma_collections():
     """
-    Connects to ChromaDB and loads the stored collections for Civil Law & Criminal Law.
+    Loads the stored collections for Civil Law & Criminal Law, each from the vector
+    store backend configured for it (ChromaDB by default).
     """
-    # Initialize ChromaDB client (persistent storage)
-    client = chromadb.PersistentClient(path="data/vector_db")
-
-    # Load collections
-    civil_law_collection = client.get_or_create_collection("civil_law_rag")
-    criminal_law_collection = client.get_or_create_collection("criminal_law_rag")
-    print("civil_law_collection loaded")
-
-    
+    civil_law_collection = get_vector_store("civil_law_rag")
+    criminal_law_collection = get_vector_store("criminal_law_rag")
+    print(f"civil_law_collection loaded ({civil_law_collection.backend}), "
+          f"criminal_law_collection loaded ({criminal_law_collection.backend})")
 
     return civil_law_collection, criminal_law_collection
-
-
@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+
+# Single manifest shared by the extract → chunk → embed stages
+MANIFEST_PATH = "data/manifest.json"
+
+
+def hash_text(text):
+    """Returns the SHA-256 hex digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Loads the ingestion manifest.
+
+    Layout:
+        pdfs:      {output_file: {pdf_path: {"hash": file hash, "pages": {page: text hash}}}}
+        documents: {chunk_file: {doc_name: extracted text hash}}
+        chunks:    {chunk_file: {chunk_id: chunk text hash}}
+        embedded:  {collection_name: {chunk_id: chunk text hash}}
+    """
+    manifest = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    for stage in ("pdfs", "documents", "chunks", "embedded"):
+        manifest.setdefault(stage, {})
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Writes the manifest atomically so an interrupted stage never leaves it half-written."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def diff_hashes(previous, current):
+    """
+    Compares two {key: hash} maps.
+
+    Returns:
+        tuple[list, list]: Keys that are new or changed in `current`, and keys removed from `previous`.
+    """
+    changed = [key for key, digest in current.items() if previous.get(key) != digest]
+    removed = [key for key in previous if key not in current]
+    return changed, removed
@@ -0,0 +1,193 @@
+import os
+import re
+import json
+from retrieval.chunking import CHUNKED_DIR, chunk_text, iter_chunks, join_windows
+
+# Acts we can name in a query, with the phrases that identify them in documents and queries
+ACT_ALIASES = {
+    "IPC": ["indian penal code", "i.p.c.", "ipc"],
+    "CPC": ["code of civil procedure", "c.p.c.", "cpc"],
+}
+
+# Section index files built next to each chunk file
+SECTION_INDEX_FILES = {
+    "civil_law": os.path.join(CHUNKED_DIR, "civil_laws_sections.json"),
+    "criminal_law": os.path.join(CHUNKED_DIR, "criminal_laws_sections.json"),
+}
+
+SECTION_REF_RE = re.compile(r"\b(?:section|sec\.?|s\.|u/s\.?)\s*(\d+[A-Z]?)\b", re.IGNORECASE)
+ORDER_REF_RE = re.compile(r"\border\s+((?-i:[IVXLC]+)|\d+)\b(?:\s*,?\s*(?:rule|r\.)\s*(\d+[A-Z]?)\b)?", re.IGNORECASE)
+HEADING_RE = re.compile(r"^(\d+)\.\s")  # Section number of older plain-text chunks
+# A capitalized "... Act" / "... Code" name, e.g. "Negotiable Instruments Act" or "NI Act"
+ACT_NAME_RE = re.compile(r"\b(?:[A-Z][\w.&'-]*\s+)+(?:Act|Code)\b")
+
+ROMAN_VALUES = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100}
+
+
+def roman_to_int(numeral):
+    """Converts a Roman numeral (as used for CPC orders) to an int."""
+    total = 0
+    for current, following in zip(numeral.upper(), numeral.upper()[1:] + " "):
+        value = ROMAN_VALUES[current]
+        total += -value if ROMAN_VALUES.get(following, 0) > value else value
+    return total
+
+
+def order_number(value):
+    """Normalizes an order written as a Roman numeral or digits to its integer string."""
+    return value if value.isdigit() else str(roman_to_int(value))
+
+
+def find_acts(text):
+    """Returns the act codes whose aliases appear in a text, in ACT_ALIASES order."""
+    lowered = text.lower()
+    return [act for act, aliases in ACT_ALIASES.items() if any(re.search(rf"(?<!\w){re.escape(alias)}(?!\w)", lowered) for alias in aliases)]
+
+
+def names_unindexed_act(text):
+    """
+    Returns True if a text names an act ("Hindu Marriage Act") that is not in ACT_ALIASES.
+    Its section numbers are not IPC or CPC section numbers.
+    """
+    lowered = text.lower()
+    known = [
+        match.span() for aliases in ACT_ALIASES.values() for alias in aliases
+        for match in re.finditer(rf"(?<!\w){re.escape(alias)}(?!\w)", lowered)
+    ]
+    for match in ACT_NAME_RE.finditer(text):
+        start, end = match.span()
+        if not any(start < known_end and known_start < end for known_start, known_end in known):
+            return True
+    return False
+
+
+def build_section_index(chunk_file, index_file):
+    """
+    Builds a (act, section number) → section lookup table from a chunk file.
+
+    The act of each document is detected from its opening text. CPC rules are keyed by
+    order and rule number. Windowed sections are stored once, with their full text.
+
+    Args:
+        chunk_file (str): Chunk JSON produced by `process_json`.
+        index_file (str): Where to write the index.
+
+    Returns:
+        dict: The index, {"acts": {doc_name: act}, "entries": {key: [{"id", "text"}]},
+        "orders": {order key: [rule keys]}}.
+    """
+    with open(chunk_file, "r", encoding="utf-8") as f:
+        chunked_data = json.load(f)
+
+    acts = {}
+    for doc_name, chunks in chunked_data.items():
+        detected = find_acts(chunk_text(chunks[0])[:2000]) if chunks else []
+        acts[doc_name] = detected[0] if detected else doc_name
+
+    # Collect the windows of every numbered section under its parent id
+    sections = {}
+    for chunk_id, doc_name, _, chunk in iter_chunks(chunked_data):
+        record = chunk if isinstance(chunk, dict) else {"text": chunk}
+        number = record.get("section_number")
+        if not number:
+            heading = HEADING_RE.match(record["text"])
+            number = heading.group(1) if heading else None
+        if not number:
+            continue
+
+        parent_id = record.get("parent_id", chunk_id)
+        if parent_id not in sections:
+            order = record.get("order")
+            key = f"{acts[doc_name]}|O{order_number(order)}|{number}" if order else f"{acts[doc_name]}|{number}"
+            sections[parent_id] = {"key": key, "windows": []}
+        sections[parent_id]["windows"].append(record)
+
+    entries, orders = {}, {}
+    for parent_id, section in sections.items():
+        windows = section["windows"]
+        text = join_windows(windows) if "window_start" in windows[0] else windows[0]["text"]
+        if section["key"] not in entries and "|O" in section["key"]:
+            order_key = section["key"].rsplit("|", 1)[0] + "|"
+            orders.setdefault(order_key, []).append(section["key"])
+        entries.setdefault(section["key"], []).append({"id": parent_id, "text": text})
+
+    index = {"acts": acts, "entries": entries, "orders": orders}
+    with open(index_file, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4)
+
+    print(f"✅ Section index with {len(entries)} keys saved to: {index_file}")
+    return index
+
+
+def load_section_indexes():
+    """Loads the section index of each law type that has one, keyed by law type."""
+    indexes = {}
+    for law_type, index_file in SECTION_INDEX_FILES.items():
+        if os.path.exists(index_file):
+            with open(index_file, "r", encoding="utf-8") as f:
+                indexes[law_type] = json.load(f)
+    return indexes
+
+
+def parse_section_references(query):
+    """
+    Extracts section and order references from a query.
+
+    "Order" is also an everyday word ("an order 2 days later", "in order I can..."), so an
+    order without a rule number only counts as a reference when the query names the CPC.
+
+    Returns:
+        tuple[list[str], list[str]]: Acts named in the query, and partial lookup keys such
+        as "376" or "O39|1" (order 39, rule 1) or "O39|" (every rule of order 39).
+    """
+    acts = find_acts(query)
+    references = [match.group(1).upper() for match in SECTION_REF_RE.finditer(query)]
+    for match in ORDER_REF_RE.finditer(query):
+        rule = match.group(2).upper() if match.group(2) else ""
+        if rule or "CPC" in acts:
+            references.append(f"O{order_number(match.group(1).upper())}|{rule}")
+    return acts, references
+
+
+def lookup_sections(query, indexes, limit):
+    """
+    Answers queries that name sections of an indexed act outright from the section indexes.
+
+    Only queries that name an act from ACT_ALIASES, and no other act, are answered here.
+    A bare "section 13" could belong to any act, and "section 13 of the Hindu Marriage
+    Act" belongs to one that is not indexed. Matching those by number alone returns
+    unrelated IPC/CPC sections as exact hits, so they are left to dense search.
+
+    Args:
+        query (str): The user's legal question.
+        indexes (dict): Section indexes from `load_section_indexes`.
+        limit (int): Maximum number of sections to return.
+
+    Returns:
+        list[dict]: Matching sections as {"id", "text"}; empty for free-text queries.
+    """
+    query_acts, references = parse_section_references(query)
+    if not references or not query_acts or names_unindexed_act(query):
+        return []
+
+    hits, seen = [], set()
+    for index in indexes.values():
+        for act in query_acts:
+            for reference in references:
+                prefix = f"{act}|{reference}"
+                if reference.endswith("|"):
+                    # A bare order reference returns its rules in document order
+                    matched = [entry for key in index.get("orders", {}).get(prefix, []) for entry in index["entries"][key]]
+                else:
+                    matched = index["entries"].get(prefix, [])
+                for entry in matched:
+                    if entry["id"] not in seen:
+                        seen.add(entry["id"])
+                        hits.append(entry)
+
+    return hits[:limit]
+
+
+if __name__ == "__main__":
+    build_section_index(os.path.join(CHUNKED_DIR, "civil_laws_chunks.json"), SECTION_INDEX_FILES["civil_law"])
+    build_section_index(os.path.join(CHUNKED_DIR, "criminal_laws_chunks.json"), SECTION_INDEX_FILES["criminal_law"])
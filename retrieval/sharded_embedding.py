@@ -0,0 +1,85 @@
+import os
+import time
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Spawned workers re-import the parent's main module, so callers must keep models and
+# vector store clients out of module-level code (see `retrieval.embedding.get_collections`)
+SHARD_OUTPUT_DIR = "data/embedding_shards"
+
+_worker_model = None
+
+
+def init_worker(model_name, threads, backend):
+    """Loads one model per worker process with a fixed number of intra-op threads."""
+    global _worker_model
+    import torch
+    from model_registry import build_sentence_transformer
+
+    # Each worker gets its own slice of the cores instead of every process using all of them
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _worker_model = build_sentence_transformer(model_name, backend)
+    _worker_model.to("cpu")
+
+
+def embed_shard(output_path, shape, first_row, texts, batch_size):
+    """Encodes one shard and writes its vectors into the shared memory-mapped output."""
+    embeddings = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+    vectors = np.memmap(output_path, dtype=np.float32, mode="r+", shape=shape)
+    vectors[first_row:first_row + len(texts)] = embeddings
+    vectors.flush()
+    return len(texts)
+
+
+def embed_texts_sharded(texts, model_name, dim, workers, threads_per_worker=None, batch_size=32, shard_size=None, output_path=None, backend="torch"):
+    """
+    Embeds texts across `workers` processes, each holding its own copy of the model.
+
+    Texts are cut into shards that are handed out as workers free up, so long and short
+    shards balance across processes. Workers write straight into a shared float32
+    memory-mapped file; the parent only reads the finished matrix.
+
+    Args:
+        texts (list[str]): Texts to embed, ideally sorted by length.
+        model_name (str): SentenceTransformer model each worker loads.
+        dim (int): Embedding dimension of the model.
+        workers (int): Number of worker processes.
+        threads_per_worker (int): Torch intra-op threads per worker (defaults to cores / workers).
+        batch_size (int): Encoder batch size inside a worker.
+        shard_size (int): Texts per task (defaults to 4 batches).
+        output_path (str): Memory-mapped output file (defaults to a file in SHARD_OUTPUT_DIR).
+        backend (str): Encoder inference backend, as in `model_registry.build_sentence_transformer`.
+
+    Returns:
+        np.memmap: (len(texts), dim) float32 matrix, row i holding the embedding of texts[i].
+    """
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    shard_size = shard_size or 4 * batch_size
+    shape = (len(texts), dim)
+
+    os.makedirs(SHARD_OUTPUT_DIR, exist_ok=True)
+    output_path = output_path or os.path.join(SHARD_OUTPUT_DIR, f"embeddings_{os.getpid()}.f32")
+    np.memmap(output_path, dtype=np.float32, mode="w+", shape=shape).flush()
+
+    print(f"🔹 Embedding {len(texts)} texts with {workers} workers x {threads_per_worker} threads")
+    started = time.perf_counter()
+    done = 0
+
+    # Spawn rather than fork: forked children inherit torch's thread pools in a broken state
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(model_name, threads_per_worker, backend)) as pool:
+        futures = [
+            pool.submit(embed_shard, output_path, shape, first, texts[first:first + shard_size], batch_size)
+            for first in range(0, len(texts), shard_size)
+        ]
+        for future in as_completed(futures):
+            done += future.result()
+            print(f"✅ Embedded {done}/{len(texts)} chunks ({done / (time.perf_counter() - started):.1f} chunks/sec)")
+
+    return np.memmap(output_path, dtype=np.float32, mode="r", shape=shape)
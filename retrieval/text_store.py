@@ -0,0 +1,113 @@
+import os
+import mmap
+import json
+import zlib
+import threading
+from config import TEXT_STORE_COMPRESSION
+
+# Chunk texts live here instead of in the vector store metadata
+TEXT_STORE_DIR = "data/text_store"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TextStore:
+    """
+    Read side of a chunk text store: an offset table {chunk id: [offset, length]} and a
+    blob of texts read through mmap, each record optionally zlib-compressed on its own
+    so any chunk can be read without touching the others.
+
+    Files (under TEXT_STORE_DIR/<name>/): texts.bin and index.json. The store reopens
+    itself when a rebuild replaces the index.
+    """
+
+    def __init__(self, name, store_dir=TEXT_STORE_DIR):
+        self.name = name
+        self.blob_path = os.path.join(store_dir, name, "texts.bin")
+        self.index_path = os.path.join(store_dir, name, "index.json")
+        self.lock = threading.Lock()
+        self.loaded_version = None
+        self.entries, self.compression, self.blob = {}, None, None
+
+    def _refresh(self):
+        """(Re)opens the files if they changed since they were last read."""
+        version = os.stat(self.index_path).st_mtime_ns if os.path.exists(self.index_path) else None
+        if version == self.loaded_version:
+            return
+
+        self.entries, self.compression, self.blob = {}, None, None
+        if version is not None:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.entries, self.compression = index["entries"], index["compression"]
+            if os.path.getsize(self.blob_path):
+                with open(self.blob_path, "rb") as f:
+                    self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.loaded_version = version
+
+    def get_many(self, chunk_ids):
+        """Returns {chunk id: text} for the ids present in the store."""
+        with self.lock:
+            self._refresh()
+            texts = {}
+            for chunk_id in chunk_ids:
+                entry = self.entries.get(chunk_id)
+                if entry is None:
+                    continue
+                offset, length = entry
+                data = self.blob[offset:offset + length]
+                texts[chunk_id] = (zlib.decompress(data) if self.compression == "zlib" else data).decode("utf-8")
+            return texts
+
+    def __len__(self):
+        with self.lock:
+            self._refresh()
+            return len(self.entries)
+
+
+def write_text_store(name, items, compression=TEXT_STORE_COMPRESSION, store_dir=TEXT_STORE_DIR):
+    """
+    Writes a text store from (chunk id, text) pairs, replacing the previous one.
+
+    The blob goes in place before the index, so a reader never holds an index that
+    points into a blob it doesn't describe.
+
+    Args:
+        name (str): Store name (the vector store collection it belongs to).
+        items (iterable[tuple[str, str]]): Chunk ids and their texts.
+        compression (str): "zlib" or "none".
+        store_dir (str): Root directory of the text stores.
+    """
+    if compression not in ("zlib", "none"):
+        raise ValueError("Text store compression must be 'zlib' or 'none'.")
+
+    directory = os.path.join(store_dir, name)
+    os.makedirs(directory, exist_ok=True)
+    blob_path, index_path = os.path.join(directory, "texts.bin"), os.path.join(directory, "index.json")
+
+    entries, offset, raw_bytes = {}, 0, 0
+    with open(f"{blob_path}.tmp", "wb") as f:
+        for chunk_id, text in items:
+            data = text.encode("utf-8")
+            raw_bytes += len(data)
+            if compression == "zlib":
+                data = zlib.compress(data)
+            f.write(data)
+            entries[chunk_id] = [offset, len(data)]
+            offset += len(data)
+    os.replace(f"{blob_path}.tmp", blob_path)
+
+    with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"compression": compression, "entries": entries}, f)
+    os.replace(f"{index_path}.tmp", index_path)
+
+    print(f"✅ Text store '{name}': {len(entries)} chunks, {raw_bytes / 1e6:.1f} MB of text in {offset / 1e6:.1f} MB ({compression})")
+
+
+def get_text_store(name):
+    """Returns the process-wide reader of a text store."""
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = TextStore(name)
+        return _stores[name]
@@ -0,0 +1,437 @@
+import os
+import json
+import time
+import argparse
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+from config import (
+    VECTOR_STORE_BACKEND, VECTOR_STORE_BACKENDS,
+    NUMPY_STORE_QUANTIZATION, NUMPY_STORE_PCA_DIM, NUMPY_STORE_RESCORE_FACTOR,
+)
+
+# Paths
+VECTOR_DB_DIR = "data/vector_db"
+NUMPY_STORE_DIR = "data/numpy_store"
+
+COLLECTION_METADATA = {"hnsw:space": "cosine", "index_type": "IVF_FLAT"}
+SCORE_BLOCK_ROWS = 16384  # Compressed codes widened to float32 per block when scoring
+
+_chroma_client = None
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class VectorStore(ABC):
+    """
+    The subset of the ChromaDB collection API the pipeline uses. Query and get results
+    keep Chroma's shape ({"ids": [[...]], "metadatas": [[...]], "distances": [[...]]})
+    so callers don't care which backend answers; distances are cosine distances.
+
+    Backends must implement every abstract method; an incomplete one fails when it is
+    created rather than on first use.
+    """
+
+    backend = None
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def manifest_key(self):
+        """Key of this store's entry in the manifest's "embedded" stage."""
+        return self.name if self.backend == "chroma" else f"{self.backend}:{self.name}"
+
+    @abstractmethod
+    def count(self):
+        """Returns the number of stored vectors."""
+
+    @abstractmethod
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "distances")):
+        """Returns the `n_results` nearest neighbours of each query embedding."""
+
+    @abstractmethod
+    def get(self, ids=None, where=None, include=("metadatas",)):
+        """Returns stored entries by id and/or metadata filter."""
+
+    @abstractmethod
+    def upsert(self, ids, embeddings, metadatas):
+        """Inserts or replaces vectors and their metadata."""
+
+    @abstractmethod
+    def delete(self, ids):
+        """Removes vectors by id."""
+
+    def flush(self):
+        """Persists pending writes (a no-op for backends that write through)."""
+
+    @abstractmethod
+    def reset(self):
+        """Drops every vector in the store."""
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB (HNSW + SQLite) collection; the choice for large corpora."""
+
+    backend = "chroma"
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.collection = get_chroma_client().get_or_create_collection(name=name, metadata=COLLECTION_METADATA)
+
+    def count(self):
+        return self.collection.count()
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "distances")):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, include=list(include))
+
+    def get(self, ids=None, where=None, include=("metadatas",)):
+        return self.collection.get(ids=ids, where=where, include=list(include))
+
+    def upsert(self, ids, embeddings, metadatas):
+        self.collection.upsert(ids=ids, embeddings=np.asarray(embeddings).tolist(), metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def reset(self):
+        client = get_chroma_client()
+        client.delete_collection(self.name)
+        self.collection = client.get_or_create_collection(name=self.name, metadata=COLLECTION_METADATA)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact search over a memory-mapped float32 matrix of unit-normalized vectors.
+
+    For a few thousand statutory chunks one matrix multiply beats HNSW plus SQLite
+    round trips and has perfect recall. Several query vectors are scored in one
+    multiply, and top-k uses argpartition instead of a full sort.
+
+    For larger corpora the store can also keep a compressed first-pass index: vectors
+    projected onto their top `pca_dim` principal directions and/or quantized to
+    float16 or int8. Queries are then scored against the small codes, and only
+    `rescore_factor` x n_results candidates are rescored against the full-precision
+    vectors, which stay on disk and are paged in row by row.
+
+    Files (under NUMPY_STORE_DIR/<name>/): vectors.f32 (n x dim), records.json (ids and
+    metadata in row order) and, when compressed, codes.npy and projection.npz.
+    Writes are kept in memory until `flush()`; until then searches are exact.
+    """
+
+    backend = "numpy"
+
+    def __init__(self, name, store_dir=NUMPY_STORE_DIR, quantization=NUMPY_STORE_QUANTIZATION,
+                 pca_dim=NUMPY_STORE_PCA_DIM, rescore_factor=NUMPY_STORE_RESCORE_FACTOR):
+        super().__init__(name)
+        if quantization not in ("none", "float16", "int8"):
+            raise ValueError("Quantization must be 'none', 'float16' or 'int8'.")
+
+        self.quantization = quantization
+        self.pca_dim = pca_dim
+        self.rescore_factor = rescore_factor
+        self.directory = os.path.join(store_dir, name)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.records_path = os.path.join(self.directory, "records.json")
+        self.codes_path = os.path.join(self.directory, "codes.npy")
+        self.projection_path = os.path.join(self.directory, "projection.npz")
+        self.lock = threading.RLock()
+        self.dirty = False
+        self._load()
+
+    @property
+    def compressed(self):
+        """Whether this store is configured to search a compressed first-pass index."""
+        return self.quantization != "none" or bool(self.pca_dim)
+
+    def _load(self):
+        self.ids, self.metadatas, self.vectors, self.pending = [], [], None, []
+        self.codes, self.components, self.scales = None, None, None
+        if os.path.exists(self.records_path):
+            with open(self.records_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            self.ids, self.metadatas = records["ids"], records["metadatas"]
+            if self.ids:
+                self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), records["dim"]))
+
+            # A first-pass index built with other settings is ignored until the next flush rebuilds it
+            settings = {"quantization": self.quantization, "pca_dim": self.pca_dim}
+            if self.ids and self.compressed and records.get("compression") == settings and os.path.exists(self.codes_path):
+                self.codes = np.load(self.codes_path, mmap_mode="r")
+                with np.load(self.projection_path, allow_pickle=False) as projection:
+                    self.components = projection["components"] if projection["components"].size else None
+                    self.scales = projection["scales"] if projection["scales"].size else None
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+
+    def _matrix(self):
+        """Returns the full vector matrix, folding in rows appended since the last call."""
+        if self.pending:
+            blocks = ([np.asarray(self.vectors)] if self.vectors is not None else []) + self.pending
+            self.vectors = np.concatenate(blocks)
+            self.pending = []
+        return self.vectors
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def _top_k(scores, k):
+        """Returns the column indices and values of the k best scores of each row, best first."""
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _build_compressed(self, matrix):
+        """Builds the first-pass codes and the projection needed to score queries against them."""
+        projected, components, scales = matrix, None, None
+        if self.pca_dim and self.pca_dim < matrix.shape[1]:
+            # Uncentered PCA keeps the best rank-p approximation of the inner products we rank by
+            _, eigenvectors = np.linalg.eigh(matrix.T @ matrix)
+            components = np.ascontiguousarray(eigenvectors[:, ::-1][:, :self.pca_dim], dtype=np.float32)
+            projected = matrix @ components
+
+        if self.quantization == "int8":
+            # Symmetric per-dimension scales, so a query scores as (query x scales) @ codes
+            scales = np.abs(projected).max(axis=0) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(projected / scales).astype(np.int8)
+        elif self.quantization == "float16":
+            codes = projected.astype(np.float16)
+        else:
+            codes = projected.astype(np.float32)
+
+        return codes, components, scales
+
+    def _approximate_scores(self, queries):
+        """Scores queries against the compressed codes, a block of rows at a time."""
+        projected = queries @ self.components if self.components is not None else queries
+        if self.scales is not None:
+            projected = projected * self.scales
+
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_BLOCK_ROWS):
+            block = np.asarray(self.codes[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = projected @ block.T
+        return scores
+
+    def _search(self, queries, k, exact=False):
+        """Returns (rows, similarities) of the top k vectors per query, best first."""
+        if exact or self.codes is None or self.dirty or self.pending:
+            return self._top_k(queries @ self._matrix().T, k)
+
+        candidates = min(len(self.ids), k * self.rescore_factor)
+        candidate_rows, _ = self._top_k(self._approximate_scores(queries), candidates)
+
+        # Rescore the short list against full-precision vectors, reading rows in file order
+        top_rows, top_scores = [], []
+        for query, rows in zip(queries, candidate_rows):
+            rows = np.sort(rows)
+            exact_scores = np.asarray(self.vectors[rows]) @ query
+            best, best_scores = self._top_k(exact_scores[None, :], k)
+            top_rows.append(rows[best[0]])
+            top_scores.append(best_scores[0])
+        return np.array(top_rows), np.array(top_scores)
+
+    def count(self):
+        return len(self.ids)
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "distances"), exact=False):
+        with self.lock:
+            queries = self._normalize(query_embeddings)
+            results = {"ids": [], "metadatas": [], "distances": []}
+            if not self.ids:
+                for key in results:
+                    results[key] = [[] for _ in queries]
+                return results
+
+            top, top_scores = self._search(queries, min(n_results, len(self.ids)), exact)
+            for rows, scores in zip(top, top_scores):
+                results["ids"].append([self.ids[row] for row in rows])
+                results["metadatas"].append([self.metadatas[row] for row in rows])
+                results["distances"].append((1.0 - scores).tolist())
+            return results
+
+    def get(self, ids=None, where=None, include=("metadatas",)):
+        with self.lock:
+            rows = [self.rows[chunk_id] for chunk_id in ids if chunk_id in self.rows] if ids is not None else range(len(self.ids))
+            if where:
+                rows = [row for row in rows if all(self.metadatas[row].get(key) == value for key, value in where.items())]
+            result = {"ids": [self.ids[row] for row in rows], "metadatas": [self.metadatas[row] for row in rows]}
+            if "embeddings" in include:
+                result["embeddings"] = np.asarray(self._matrix()[list(rows)]) if rows else np.zeros((0, 0), dtype=np.float32)
+            return result
+
+    def upsert(self, ids, embeddings, metadatas):
+        with self.lock:
+            vectors = self._normalize(embeddings)
+            new_rows = []
+            for chunk_id, vector, metadata in zip(ids, vectors, metadatas):
+                row = self.rows.get(chunk_id)
+                if row is None:
+                    self.rows[chunk_id] = len(self.ids)
+                    self.ids.append(chunk_id)
+                    self.metadatas.append(metadata)
+                    new_rows.append(vector)
+                else:
+                    matrix = self._matrix()
+                    if not matrix.flags.writeable:
+                        self.vectors = matrix = np.array(matrix)
+                    matrix[row] = vector
+                    self.metadatas[row] = metadata
+            if new_rows:
+                self.pending.append(np.stack(new_rows))
+            self.dirty = True
+
+    def delete(self, ids):
+        with self.lock:
+            removed = {self.rows[chunk_id] for chunk_id in ids if chunk_id in self.rows}
+            if not removed:
+                return
+            keep = [row for row in range(len(self.ids)) if row not in removed]
+            self.vectors = np.asarray(self._matrix())[keep]
+            self.ids = [self.ids[row] for row in keep]
+            self.metadatas = [self.metadatas[row] for row in keep]
+            self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            self.dirty = True
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            matrix = self._matrix()
+            dim = matrix.shape[1] if matrix is not None else 0
+            records = {"dim": dim, "ids": self.ids, "metadatas": self.metadatas}
+
+            # Write every file under a temporary name first so readers never see a torn store
+            if matrix is not None and len(matrix):
+                matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+                matrix.tofile(f"{self.vectors_path}.tmp")
+                os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+
+                if self.compressed:
+                    codes, components, scales = self._build_compressed(matrix)
+                    empty = np.zeros(0, dtype=np.float32)
+                    with open(f"{self.codes_path}.tmp", "wb") as f:
+                        np.save(f, codes)
+                    with open(f"{self.projection_path}.tmp", "wb") as f:
+                        np.savez(f, components=empty if components is None else components, scales=empty if scales is None else scales)
+                    os.replace(f"{self.codes_path}.tmp", self.codes_path)
+                    os.replace(f"{self.projection_path}.tmp", self.projection_path)
+                    records["compression"] = {"quantization": self.quantization, "pca_dim": self.pca_dim}
+
+            with open(f"{self.records_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(records, f)
+            os.replace(f"{self.records_path}.tmp", self.records_path)
+
+            self.dirty = False
+            self._load()
+
+    def reset(self):
+        with self.lock:
+            for path in (self.vectors_path, self.records_path, self.codes_path, self.projection_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._load()
+
+    def memory_bytes(self):
+        """Bytes the first-pass search keeps resident: the codes if compressed, else all vectors."""
+        with self.lock:
+            if self.codes is not None:
+                extra = sum(array.nbytes for array in (self.components, self.scales) if array is not None)
+                return self.codes.nbytes + extra
+            return self._matrix().nbytes if self.ids else 0
+
+
+VECTOR_STORE_CLASSES = {"chroma": ChromaVectorStore, "numpy": NumpyVectorStore}
+
+
+def get_chroma_client():
+    """Returns the process-wide persistent ChromaDB client."""
+    global _chroma_client
+    if _chroma_client is None:
+        import chromadb
+        os.makedirs(VECTOR_DB_DIR, exist_ok=True)
+        _chroma_client = chromadb.PersistentClient(path=VECTOR_DB_DIR)
+    return _chroma_client
+
+
+def get_vector_store(name, backend=None):
+    """
+    Returns the store of a collection, using the backend configured for it
+    (VECTOR_STORE_BACKENDS per collection, else VECTOR_STORE_BACKEND).
+    """
+    backend = backend or VECTOR_STORE_BACKENDS.get(name, VECTOR_STORE_BACKEND)
+    if backend not in VECTOR_STORE_CLASSES:
+        raise ValueError(f"Unknown vector store backend '{backend}'. Choose from {sorted(VECTOR_STORE_CLASSES)}.")
+
+    with _stores_lock:
+        if (backend, name) not in _stores:
+            _stores[(backend, name)] = VECTOR_STORE_CLASSES[backend](name)
+        return _stores[(backend, name)]
+
+
+def evaluate_compression(store, k=10, sample=200, query_embeddings=None, seed=0):
+    """
+    Measures what a numpy store's compressed first pass costs in recall and saves in
+    memory and time, against exact float32 search over the same vectors.
+
+    Without `query_embeddings`, `sample` stored chunk vectors are used as queries, and
+    each query's own chunk is left out of both result lists.
+
+    Returns:
+        dict: recall@k, per-query search times and resident first-pass bytes.
+    """
+    if store.codes is None:
+        raise ValueError(f"Store '{store.name}' has no compressed index; set NUMPY_STORE_QUANTIZATION or NUMPY_STORE_PCA_DIM and rebuild it.")
+
+    exclude = [None] * len(query_embeddings) if query_embeddings is not None else None
+    if query_embeddings is None:
+        rows = np.random.default_rng(seed).choice(len(store.ids), size=min(sample, len(store.ids)), replace=False)
+        query_embeddings = np.asarray(store.vectors[np.sort(rows)])
+        exclude = [store.ids[row] for row in np.sort(rows)]
+
+    n_results = k + 1 if exclude[0] is not None else k
+    timings = {}
+    results = {}
+    for mode, exact in (("exact", True), ("compressed", False)):
+        started = time.perf_counter()
+        results[mode] = store.query(query_embeddings, n_results=n_results, exact=exact)["ids"]
+        timings[mode] = (time.perf_counter() - started) / len(query_embeddings) * 1000
+
+    overlaps = []
+    for own_id, exact_ids, compressed_ids in zip(exclude, results["exact"], results["compressed"]):
+        exact_ids = [chunk_id for chunk_id in exact_ids if chunk_id != own_id][:k]
+        compressed_ids = [chunk_id for chunk_id in compressed_ids if chunk_id != own_id][:k]
+        overlaps.append(len(set(exact_ids) & set(compressed_ids)) / max(len(exact_ids), 1))
+
+    return {
+        "collection": store.name,
+        "quantization": store.quantization,
+        "pca_dim": store.pca_dim,
+        f"recall@{k}": float(np.mean(overlaps)),
+        "exact_ms_per_query": timings["exact"],
+        "compressed_ms_per_query": timings["compressed"],
+        "float32_bytes": len(store.ids) * store.vectors.shape[1] * 4,
+        "first_pass_bytes": store.memory_bytes(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recall and savings of the numpy backend's compressed first pass.")
+    parser.add_argument("collections", nargs="*", default=["civil_law_rag", "criminal_law_rag"], help="Collections to evaluate.")
+    parser.add_argument("--k", type=int, default=10, help="Recall cut-off.")
+    parser.add_argument("--sample", type=int, default=200, help="Stored chunk vectors used as queries.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the compressed index with the current settings first.")
+    args = parser.parse_args()
+
+    for name in args.collections:
+        store = get_vector_store(name, backend="numpy")
+        if args.rebuild:
+            store.dirty = True
+            store.flush()
+        print(json.dumps(evaluate_compression(store, args.k, args.sample), indent=4))
@@ -0,0 +1,72 @@
+import json
+import pytest
+from retrieval.section_index import build_section_index, lookup_sections, names_unindexed_act, parse_section_references
+
+
+CHUNKS = {
+    "civil_laws_book.pdf": [
+        {"text": "THE CODE OF CIVIL PROCEDURE, 1908", "section_number": None},
+        {"text": "13. When foreign judgment not conclusive.", "section_number": "13"},
+        {"text": "138. Power of High Court to require evidence to be recorded in English.", "section_number": "138"},
+        {"text": "1. Cases in which temporary injunction may be granted.", "section_number": "1", "order": "XXXIX"},
+    ],
+    "criminal_laws_book.pdf": [
+        {"text": "THE INDIAN PENAL CODE, 1860", "section_number": None},
+        {"text": "138. Abetment of act of insubordination by soldier.", "section_number": "138"},
+        {"text": "302. Punishment for murder.", "section_number": "302"},
+    ],
+}
+
+
+@pytest.fixture
+def indexes(tmp_path):
+    built = {}
+    for law_type, doc_name in (("civil_law", "civil_laws_book.pdf"), ("criminal_law", "criminal_laws_book.pdf")):
+        chunk_file = tmp_path / f"{law_type}_chunks.json"
+        chunk_file.write_text(json.dumps({doc_name: CHUNKS[doc_name]}), encoding="utf-8")
+        built[law_type] = build_section_index(str(chunk_file), str(tmp_path / f"{law_type}_sections.json"))
+    return built
+
+
+def hit_texts(query, indexes, limit=3):
+    return [hit["text"] for hit in lookup_sections(query, indexes, limit)]
+
+
+def test_named_indexed_act_is_answered_from_the_index(indexes):
+    assert hit_texts("What is the punishment under Section 302 IPC?", indexes) == ["302. Punishment for murder."]
+    assert hit_texts("Explain section 138 of the Indian Penal Code", indexes) == ["138. Abetment of act of insubordination by soldier."]
+
+
+def test_order_rule_of_the_cpc(indexes):
+    assert hit_texts("Order XXXIX rule 1 CPC temporary injunction", indexes) == ["1. Cases in which temporary injunction may be granted."]
+
+
+@pytest.mark.parametrize("query", [
+    "Explain section 138 of the Negotiable Instruments Act",
+    "What does Section 13 of the Hindu Marriage Act say about divorce?",
+    "What is section 138 of the NI Act and section 302 IPC?",
+])
+def test_unindexed_act_falls_through_to_dense_search(indexes, query):
+    assert hit_texts(query, indexes) == []
+
+
+@pytest.mark.parametrize("query", [
+    "What is section 13?",
+    "Is there a bail provision in sec. 138",
+    "Order 39 rule 1 temporary injunction",
+])
+def test_reference_without_an_act_falls_through_to_dense_search(indexes, query):
+    assert hit_texts(query, indexes) == []
+
+
+def test_unindexed_act_detection():
+    assert names_unindexed_act("section 138 of the Negotiable Instruments Act")
+    assert names_unindexed_act("section 13 of the Hindu Marriage Act and section 9 CPC")
+    assert not names_unindexed_act("section 302 of the Indian Penal Code")
+    assert not names_unindexed_act("The Code of Civil Procedure, section 9")
+    assert not names_unindexed_act("what is the act of abetment under section 107 IPC")
+
+
+def test_order_without_rule_needs_the_cpc():
+    assert parse_section_references("I got an order 2 days later") == ([], [])
+    assert parse_section_references("Order XXXIX of the CPC") == (["CPC"], ["O39|"])